@@ -1,153 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for
-import pandas as pd
-import requests
-from google_play_scraper import search, app as google_play_app
-from google_play_scraper.exceptions import ExtraHTTPError
+import os
+import json
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context
+from scraper_core import (
+    STORES, iter_search_records, fill_missing_details, run_pipeline, ListSink, CallbackSink,
+    ResultCache, make_search_key, PARTIAL_RESULT_TTL, record_key, description_preview, JobManager,
+    query_records, query_records_after, filter_records, sort_records, query_fingerprint, filter_options, SORT_FIELDS, FILTER_FIELDS,
+    make_record, resolve_fields, project_record, iter_export, EXPORT_FORMATS, CatalogSink, get_catalog, ScrapeContext,
+    store_is_down, limiter_stats, breaker_stats, get_rate_limiter, get_detail_cache,
+)
 
 app = Flask(__name__)
 
-# Function to determine the price model for Google Play
-def get_google_play_price_model(details):
-    price = details.get("price", "")
-    
-    # Check if the price is an integer or float and convert it to string
-    if isinstance(price, (int, float)):
-        price = str(price)  # Convert to string if it's an integer or float
-    
-    # Check for free apps or zero-price
-    if isinstance(price, str) and "free" in price.lower():
-        return "Free"
-    elif price == "0" or price == "0.0":
-        return "Free"  # Explicitly handle the case where the price is 0
-    else:
-        return "Paid"
-
-
-# Google Play Scraping Function with error handling
-def scrape_google_play(keyword, max_results=500, country="US", device_type="mobile"):
-    if not keyword:
-        print("Keyword cannot be empty.")
-        return []
-
-    all_results = []
-    try:
-        # Scrape results in batches
-        results = search(keyword, lang="en", country=country)
-        all_results.extend(results[:max_results])
-
-        apps_data = []
-        for app_info in all_results:
-            app_id = app_info["appId"]
-            try:
-                details = google_play_app(app_id) 
-            except ExtraHTTPError as e:
-                print(f"Error fetching details for app {app_id}: {e}")
-                continue  # Skip if there's an error fetching details for this app
-            
-            # Get price model
-            price_model = get_google_play_price_model(details)
-            
-            # Default "Mobile", check if its available on other platforms
-            app_type = "Mobile"
-            if device_type == "desktop":
-                # Only add apps that mention Chromebook or Android TV for desktop
-                if "Chromebook" in details.get("genre", "") or "Android TV" in details.get("genre", ""):
-                    app_type = "Mobile, Chromebook" if "Chromebook" in details.get("genre", "") else app_type
-                    app_type = "Mobile, Android TV" if "Android TV" in details.get("genre", "") else app_type
-                else:
-                    continue  # Skip if the app is not for desktop
-            elif device_type == "mobile" and not ("Chromebook" in details.get("genre", "") or "Android TV" in details.get("genre", "")):
-                continue  # Skip non-mobile apps if 'mobile' device type is selected
-
-            country_available = country  # Default to the passed country
-
-            # Prepare the description to make it more readable
-            description = details.get("description", "").replace('\n', '<br>')
-
-            apps_data.append({
-                "Name": details.get("title"),
-                "Description": description,
-                "Rating": details.get("score"),
-                "Category": details.get("genre"),
-                "Developer": details.get("developer"),
-                "Release Date": details.get("released"),
-                "Age Limit": details.get("contentRating"),
-                "Country": country_available if country_available else "Not Detected",  # Ensure country is set or use fallback
-                "Price Model": price_model,
-                "URL": f"https://play.google.com/store/apps/details?id={app_id}",
-                "Platform": "Google Play",
-                "Type": app_type
-            })
-        
-        return apps_data
-
-    except ExtraHTTPError as e:
-        print(f"Error occurred while scraping Google Play: {e}")
-        return []
-
-
-# Function to determine the price model for App Store
-def get_app_store_price_model(app_info):
-    price = app_info.get("price", 0.0)
-    if price == 0.0:
-        return "Free"
-    elif app_info.get("isInAppPurchaseEnabled", False):
-        return "Freemium"
-
-# App Store Scraping Function with error handling
-def scrape_app_store(keyword, max_results=500, country="US", device_type="mobile"):
-    if not keyword:
-        print("Keyword cannot be empty.")
-        return []
-
-    url = f"https://itunes.apple.com/search?term={keyword}&entity=software&limit={max_results}&country={country}"
-    
-    try:
-        response = requests.get(url)
-        data = response.json()
-
-        apps_data = []
-        for app_info in data.get("results", []):
-            # Get the price model for the App Store app
-            price_model = get_app_store_price_model(app_info)
-
-            # Default "Mobile", check if its available on other platforms
-            app_type = "Mobile" 
-            if device_type == "desktop":
-                # Only add macOS apps for desktop
-                if 'macOS' in app_info.get("kind", ""):
-                    app_type = "Desktop (macOS)"
-                else:
-                    continue  # Skip if the app is not for desktop
-            elif device_type == "mobile" and 'macOS' in app_info.get("kind", ""):
-                continue  # Skip macOS apps if 'mobile' device type is selected
-
-            url = app_info.get("trackViewUrl", "")
-            country_code = url.split("/")[3] if len(url.split("/")) > 3 else "US"  # Extract country code
-
-            # Prepare description with paragraphs
-            description = app_info.get("description", "").replace('\n', '<br>')
-
-            apps_data.append({
-                "Name": app_info.get("trackName"),
-                "Description": description,
-                "Rating": app_info.get("averageUserRating"),
-                "Category": app_info.get("primaryGenreName"),
-                "Developer": app_info.get("artistName"),
-                "Release Date": app_info.get("releaseDate"),
-                "Age Limit": app_info.get("contentAdvisoryRating"),
-                "Country": country_code if country_code else "Not Detected",  # Ensure country is set or use fallback
-                "Price Model": price_model,
-                "URL": app_info.get("trackViewUrl"),
-                "Platform": "App Store",
-                "Type": app_type
-            })
-
-        return apps_data
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error occurred while scraping the App Store: {e}")
-        return []
+# Finished searches, shared by every request handled by this process. Single apps can be found by record_key
+result_cache = ResultCache(index_key=record_key)
+
+# Form/URL platform value for a record's "Platform"
+PLATFORM_KEYS = {store.PLATFORM: key for key, store in STORES.items()}
+
+# Background scrapes started through /jobs
+job_manager = JobManager()
+
+# Seconds a page request may spend scraping, whatever is ready by then is shown as a partial result
+SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", 20))
+
+# Seconds between keep-alives of an idle job stream, also how long it takes to notice the client has gone
+SSE_KEEP_ALIVE = float(os.environ.get("SSE_KEEP_ALIVE", 5))
 
 
 @app.route('/')
@@ -155,27 +32,333 @@ def index():
     return render_template('index.html')
 
 
+# Read the search parameters from a submitted form
+def get_search_params(form):
+    return {
+        "keyword": form.get('keyword'),  # Get the keyword from the form
+        "platform": form.get('platform'),  # Get the selected platform
+        "device_type": form.get('device_type'),  # Get the selected device type (mobile or desktop)
+        "country": form.get('country') or "US",  # Get the selected country (defaults to US)
+        "fast": bool(form.get('fast')),  # Build records from search results only, without detail pages
+    }
+
+
+# Scrape based on the selected platform and device type, identical searches share one cached result
+# Every record is also upserted into the app catalog and written to the extra sinks as soon as it is scraped.
+# With a timeout the scrape stops at its deadline. Returns the records and the ScrapeContext of the scrape they came from,
+# whose partial/pending tell whether it was cut short
+def run_search(keyword, platform, device_type=None, country="US", fast=False, progress=None, sinks=(), timeout=None,
+               context=None):
+    key = make_search_key(keyword, platform, device_type, country, fast)
+
+    # While the store is down, the last result we had for this search beats waiting on calls that would fail anyway
+    if store_is_down(platform):
+        stale, info = result_cache.get_stale(key)
+        if stale is not None:
+            return stale, info
+
+    context = context or ScrapeContext(timeout=timeout)
+    sink = ListSink()
+
+    def run_scrape():
+        records = iter_search_records(platform, keyword, max_results=500, country=country, device_type=device_type,
+                                      progress=progress, fast=fast, context=context)
+        return run_pipeline(records, sink, CatalogSink(get_catalog()), *sinks)[0], context
+
+    # Results cut short by an upstream failure or the deadline are only cached for a little while, the ones of a
+    # cancelled scrape not at all
+    def ttl(info):
+        if info.cancelled.is_set():
+            return 0
+        return PARTIAL_RESULT_TTL if info.partial else None
+
+    # A search with a deadline makes do with partial results (it would be cut short itself), one without scrapes again
+    def accept(info):
+        return not info.cancelled.is_set() and (not info.partial or context.deadline is not None)
+
+    # Concurrent identical searches wait on the same scrape, at most until their own deadline
+    records, info = result_cache.get_or_compute(key, run_scrape, ttl=ttl, accept=accept, timeout=context.remaining(),
+                                                snapshot=lambda: list(sink.records))
+    if info is None:
+        context.expire()  # Out of time waiting on another search's scrape, what it has so far is all we get
+        return records or [], context
+    return records, info
+
+
+# Start a background job for a search, streaming its records to the job as they are scraped.
+# The scrape runs under the job's context, so cancelling the job stops it
+def start_search_job(params):
+    return job_manager.submit(params, lambda job: run_search(progress=job.update_progress, sinks=[CallbackSink(job.add_record)],
+                                                             context=job.context, **params)[0])
+
+
+# JSON for a record that the browser can parse
+def to_json(value):
+    return json.dumps(value, default=str)
+
+
+# What a results table row needs: the record with a short description preview instead of the full text,
+# which the page loads from /apps/.../description only when "Read More" is clicked
+def to_table_row(record):
+    row = make_record(record)
+    row["Description"], row["Has More"] = description_preview(record.get("Description"))
+    if record.get("Description") is None:
+        row["Has More"] = True  # Fast mode record, the description hasn't been loaded yet
+    row["Description URL"] = url_for('app_description', platform=PLATFORM_KEYS.get(record.get("Platform"), ""),
+                                     app_id=record.get("App ID") or "", country=record.get("Country"))
+    return row
+
+
 @app.route('/search', methods=['POST'])
 def search_apps():
-    keyword = request.form.get('keyword')  # Get the keyword from the form
-    platform = request.form.get('platform')  # Get the selected platform
-    device_type = request.form.get('device_type')  # Get the selected device type (mobile or desktop)
-
-    # Scrape based on the selected platform and device type
-    if platform == 'google_play':
-        google_play_apps = scrape_google_play(keyword, max_results=500, device_type=device_type)
-        app_store_apps = []  # No App Store results
-    elif platform == 'app_store':
-        google_play_apps = []  # No Google Play results
-        app_store_apps = scrape_app_store(keyword, max_results=500, device_type=device_type)
-
-    # Combine both datasets
-    df_combined = pd.DataFrame(google_play_apps + app_store_apps)
-    
-    # Debugging: Print the data being passed to the template
-    print("Combined Data:", df_combined.to_dict(orient='records'))
-
-    return render_template('results.html', apps=df_combined.to_dict(orient='records'))
+    params = get_search_params(request.form)
+
+    # Live mode: render the page straight away and let it append rows as they are streamed
+    if request.form.get('live'):
+        job = start_search_job(params)
+        return render_template('results.html', apps=[], job_id=job.id)
+
+    # Redirect to a GET page so paging, sorting and filtering are plain links over the cached result set
+    return redirect(url_for('results', **{key: value for key, value in params.items() if value}))
+
+
+# One page of a search's results, sorted and filtered on the server
+@app.route('/results')
+def results():
+    params = get_search_params(request.args)
+    records, context = run_search(timeout=SEARCH_TIMEOUT, **params)
+
+    filters = {key: request.args.get(key) for key in FILTER_FIELDS if request.args.get(key)}
+    sort = request.args.get('sort') if request.args.get('sort') in SORT_FIELDS else None
+    descending = request.args.get('order') == 'desc'
+    page = query_records(records, filters=filters, sort=sort, descending=descending,
+                         page=request.args.get('page', 1), size=request.args.get('size', 50))
+
+    # Query string of this page, so links can change one parameter and keep the rest
+    query = {key: value for key, value in params.items() if value}
+    query.update(filters)
+    if sort:
+        query.update(sort=sort, order='desc' if descending else 'asc')
+    query['size'] = page['size']
+
+    return render_template(
+        'results.html',
+        apps=[to_table_row(record) for record in page['rows']],
+        page=page,
+        query=query,
+        filters=filters,
+        options=filter_options(records),
+        sort=sort,
+        descending=descending,
+        page_url=lambda **changes: url_for('results', **{**query, **changes}),
+        partial=bool(context and context.partial),
+        pending=context.pending if context else 0,
+    )
+
+
+# JSON search results with cursor pagination and optional field projection (?fields=Name,Rating,URL)
+@app.route('/api/search')
+def api_search():
+    params = get_search_params(request.args)
+    if not params["keyword"] or params["platform"] not in STORES:
+        return jsonify({"error": "keyword and platform (google_play or app_store) are required"}), 400
+
+    try:
+        fields = resolve_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filters = {key: request.args.get(key) for key in FILTER_FIELDS if request.args.get(key)}
+    sort = request.args.get('sort') if request.args.get('sort') in SORT_FIELDS else None
+    descending = request.args.get('order') == 'desc'
+    fingerprint = query_fingerprint(make_search_key(**params), filters, sort, descending)
+
+    records, context = run_search(timeout=SEARCH_TIMEOUT, **params)
+    try:
+        batch = query_records_after(records, cursor=request.args.get('cursor'), fingerprint=fingerprint, filters=filters,
+                                    sort=sort, descending=descending, limit=request.args.get('limit', 50))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "results": [project_record(record, fields) for record in batch["rows"]],
+        "total": batch["total"],
+        "next_cursor": batch["next_cursor"],
+        "partial": bool(context and context.partial),
+        "pending": context.pending if context else 0,
+    })
+
+
+# Stream records as a CSV or NDJSON download, row by row
+def export_response(records, export_format, fields, filename):
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    return Response(stream_with_context(iter_export(records, export_format, fields)),
+                    mimetype=EXPORT_FORMATS[export_format], headers=headers)
+
+
+# Export a search (filtered and sorted like /results) from the result cache
+@app.route('/export.<export_format>')
+def export_search(export_format):
+    params = get_search_params(request.args)
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Unknown export format"}), 404
+    if not params["keyword"] or params["platform"] not in STORES:
+        return jsonify({"error": "keyword and platform (google_play or app_store) are required"}), 400
+
+    try:
+        fields = resolve_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # No deadline: a download has no banner to say it was cut short, so it waits for the full result
+    records, _ = run_search(**params)
+    filters = {key: request.args.get(key) for key in FILTER_FIELDS if request.args.get(key)}
+    sort = request.args.get('sort') if request.args.get('sort') in SORT_FIELDS else None
+    records = sort_records(filter_records(records, filters), sort=sort, descending=request.args.get('order') == 'desc')
+
+    return export_response(records, export_format, fields, "apps")
+
+
+# Export the records of a job, following it until it finishes if it is still running
+@app.route('/jobs/<job_id>/export.<export_format>')
+def export_job(job_id, export_format):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Unknown export format"}), 404
+
+    try:
+        fields = resolve_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return export_response(job.iter_records(), export_format, fields, f"apps-{job.id}")
+
+
+# Query the app catalog of everything scraped so far, e.g. /api/catalog?category=Health&min_rating=4
+@app.route('/api/catalog')
+def api_catalog():
+    try:
+        fields = resolve_fields(request.args.get('fields', ''))
+        min_rating = float(request.args['min_rating']) if request.args.get('min_rating') else None
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filters = {
+        "developer": request.args.get('developer'),
+        "category": request.args.get('category'),
+        "price_model": request.args.get('price_model'),
+        "platform": request.args.get('app_platform'),
+        "country": request.args.get('country'),
+        "min_rating": min_rating,
+    }
+    catalog = get_catalog()
+    records = catalog.query(order_by=request.args.get('sort', 'rating'), descending=request.args.get('order') != 'asc',
+                            limit=limit, offset=offset, **filters)
+
+    return jsonify({
+        "results": [project_record(record, fields) for record in records],
+        "total": catalog.count(**filters),
+    })
+
+
+# Start a scrape in the background and return its job ID straight away
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    params = get_search_params(request.get_json(silent=True) or request.form)
+    if not params["keyword"] or params["platform"] not in ('google_play', 'app_store'):
+        return jsonify({"error": "keyword and platform (google_play or app_store) are required"}), 400
+
+    job = start_search_job(params)
+    return jsonify({"job_id": job.id, "status_url": url_for('get_job', job_id=job.id)}), 202
+
+
+# Status, progress counts and (once finished) the results of a background scrape
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job.touch()
+    return jsonify(job.to_dict())
+
+
+# Stop a background scrape, e.g. when the page streaming it is closed (sent with navigator.sendBeacon)
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job.cancel()
+    return jsonify(job.to_dict(include_results=False)), 202
+
+
+# Server-Sent Events: one "record" event per app as soon as it is scraped, then a "done" event
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    # Each record's id is how many records the client has once it got it. A reconnecting EventSource sends the last one
+    # back as Last-Event-ID, so it picks up after the records it already has instead of getting them all again
+    last_event_id = request.headers.get("Last-Event-ID", "")
+    start = int(last_event_id) if last_event_id.isdigit() else 0
+
+    # The server closes the generator once a write to a disconnected client fails (the keep-alive makes sure one comes
+    # soon), which closes the stream, and the job's scrape is cancelled if no client comes back
+    def generate():
+        job.open_stream()
+        try:
+            sent = start
+            while True:
+                records, finished = job.wait_for_records(sent, timeout=SSE_KEEP_ALIVE)
+                for index, record in enumerate(records, start=sent + 1):
+                    yield f"event: record\nid: {index}\ndata: {to_json(to_table_row(record))}\n\n"
+                sent += len(records)
+
+                if finished:
+                    yield f"event: done\ndata: {to_json(job.to_dict(include_results=False))}\n\n"
+                    return
+                if not records:
+                    yield ": keep-alive\n\n"  # Stops proxies from closing an idle stream
+        finally:
+            job.close_stream()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+
+# Full description of one app, served from the result cache (or the store if the search has expired)
+@app.route('/apps/<platform>/<path:app_id>/description')
+def app_description(platform, app_id):
+    store = STORES.get(platform)
+    if store is None:
+        return jsonify({"error": "Unknown platform"}), 404
+
+    country = (request.args.get('country') or "US").upper()
+    record = result_cache.find((store.PLATFORM, app_id, country)) or store.fetch_record(app_id, country=country)
+    if record is None:
+        return jsonify({"error": "App not found"}), 404
+
+    # Fast mode records only get their full description once someone asks for it
+    record = fill_missing_details(record)
+    return jsonify({"description": record.get("Description") or ""})
+
+
+# Current adaptive concurrency limits, circuit breaker states, rate limit buckets and cache counters of this process
+@app.route('/metrics')
+def metrics():
+    return jsonify({
+        "concurrency": limiter_stats(),
+        "circuits": breaker_stats(),
+        "rate_limits": get_rate_limiter().stats(),
+        "result_cache": result_cache.stats(),
+        "detail_cache": get_detail_cache().stats(),
+    })
 
 
 if __name__ == '__main__':
@@ -1,208 +1,196 @@
-import requests
-from google_play_scraper import search, app
-import pandas as pd
-from google_play_scraper.exceptions import ExtraHTTPError
-
-
-# Function to determine the price model for Google Play
-def get_google_play_price_model(details):
-    price = details.get("price", "")
-    
-    if isinstance(price, (int, float)):
-        price = str(price)
-    
-    if isinstance(price, str) and "free" in price.lower():
-        return "Free"
-    elif price == "0" or price == "0.0":
-        return "Free"
-    else:
-        return "Paid"
-
-
-# Google Play Scraping
-def scrape_google_play(keyword, max_results=500, country="US"):
-    all_results = []
-    start = 0  
-    batch_size = 50 
-
-    try:
-        if not keyword:
-            raise ValueError("Keyword cannot be empty")
-        
-        # Scraping in batches with pagination
-        while len(all_results) < max_results:
-            results = search(keyword, lang="en", country=country, num_results=batch_size, start=start)
-            
-            if not results:
-                print("No more results found.")
-                break  # Exit if no results are returned
-
-            all_results.extend(results)
-            start += batch_size  # Move to the next set of results
-            
-            # Print out the current progress
-            print(f"Found {len(all_results)} results so far.")
-            
-            if len(results) < batch_size:
-                print("Less than batch size results, ending scrape.")
-                break  # Exit if the batch is smaller than the defined batch size
-
-    except ExtraHTTPError as e:
-        print(f"Error occurred while scraping Google Play: {str(e)}")
-        return []
-    except ValueError as e:
-        print(str(e))
-        return []
-
-    apps_data = []
-    for app_info in all_results[:max_results]:
-        app_id = app_info["appId"]
+import time
+import queue
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from scraper_core import iter_search_records, run_pipeline, CsvSink, CountingSink, Catalog, CatalogSink, Checkpoint, crawl_key
+from scraper_core import ScrapeContext
+from scraper_core.catalog import CATALOG_PATH
+from scraper_core.checkpoint import CHECKPOINT_PATH
+from scraper_core.google_play import DETAIL_WORKERS
+
+# The scrape functions stay importable from here for scripts and notebooks
+from scraper_core import scrape_google_play, scrape_app_store  # noqa: F401
+
+
+# One (platform, keyword, country) crawl as a record stream
+# With a catalog, apps that haven't changed since they were stored are taken from it instead of being fetched again.
+# With a checkpoint (a CrawlCheckpoint), the crawl resumes wherever an interrupted run of it stopped.
+# Cancelling `context` stops the crawl
+def iter_crawl_records(platform, keyword, country, max_results=500, detail_workers=DETAIL_WORKERS, fast=False, catalog=None,
+                       checkpoint=None, context=None):
+    options = {"max_workers": detail_workers} if platform == "google_play" else {}
+    return iter_search_records(platform, keyword, max_results=max_results, country=country, fast=fast, catalog=catalog,
+                               checkpoint=checkpoint, context=context, **options)
+
+
+# What identifies a crawl in the checkpoint, running it again with the same options resumes it
+def get_crawl_params(crawl, max_results=500, fast=False):
+    platform, keyword, country = crawl
+    return {"platform": platform, "keyword": keyword, "country": country.upper(), "max_results": max_results, "fast": fast}
+
+
+# Run many crawls at once and merge their records into one stream, dropping apps already seen.
+# If the consumer stops early (a sink failed, Ctrl-C) every crawl is cancelled, so none is left blocked on the full queue
+def iter_batch_records(crawls, workers=4, max_results=500, detail_workers=DETAIL_WORKERS, fast=False, catalog=None,
+                       checkpoint=None):
+    records = queue.Queue(maxsize=1000)
+    done = object()
+    contexts = {crawl: ScrapeContext() for crawl in crawls}  # Cancelled once nobody reads the records
+
+    # Queue an item unless the crawl is cancelled first, returns whether it was queued
+    def put(item, context):
+        while not context.cancelled.is_set():
+            try:
+                records.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(crawl):
+        context = contexts[crawl]
         try:
-            details = app(app_id, lang="en", country=country)
-        except ExtraHTTPError as e:
-            print(f"Error fetching details for app {app_id}: {str(e)}")
-            continue  # Skip this app if we fail to fetch its details
-        
-        # Get price model
-        price_model = get_google_play_price_model(details)
-        
-        # Dynamically set the country value if available
-        country_available = country
-
-        # Default "Mobile"
-        app_type = "Mobile"
-
-        # Check if the app is available on Chromebook or Android TV
-        if "Chromebook" in details.get("genre", ""):
-            app_type = "Mobile, Desktop (Chromebook)"
-        elif "Android TV" in details.get("genre", ""):
-            app_type = "Mobile, Android TV"
-        
-        description = details.get("description", "").replace('\n', '<br>')
-
-        apps_data.append({
-            "Name": details.get("title"),
-            "Description": description,
-            "Rating": details.get("score"),
-            "Category": details.get("genre"),
-            "Developer": details.get("developer"),
-            "Release Date": details.get("released", "Not Available"),
-            "Age Limit": details.get("contentRating", "Not Available"),
-            "Country": country_available,
-            "Platform": "Google Play",
-            "Type": app_type,
-            "Price Model": price_model,
-            "URL": f"https://play.google.com/store/apps/details?id={app_id}"
-        })
-
-    return apps_data
-
-
-# Function to determine the price model for App Store
-def get_app_store_price_model(app_info):
-    price = app_info.get("price", 0.0)
-    if price == 0.0:
-        return "Free"
-    elif app_info.get("isInAppPurchaseEnabled", False):
-        return "Freemium"
-    else:
-        return "Premium"
-
-
-# App Store Scraping
-def scrape_app_store(keyword, max_results=500, country="US"):
-    all_results = []
-    offset = 0
-
-    try:
-        if not keyword:
-            raise ValueError("Keyword cannot be empty")
-        
-        while len(all_results) < max_results:
-            url = f"https://itunes.apple.com/search?term={keyword}&entity=software&limit=50&offset={offset}&country={country}"
-            response = requests.get(url)
-            data = response.json()
-
-            if "results" not in data or not data["results"]:
-                break  # Exit if no results are found
-
-            all_results.extend(data["results"])
-            offset += 50
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error occurred while scraping App Store: {str(e)}")
-        return []
-    except ValueError as e:
-        print(str(e))
-        return []
-
-    apps_data = []
-    for app_info in all_results[:max_results]:
+            state = checkpoint.crawl(**get_crawl_params(crawl, max_results, fast)) if checkpoint else None
+            for record in iter_crawl_records(*crawl, max_results=max_results, detail_workers=detail_workers, fast=fast,
+                                             catalog=catalog, checkpoint=state, context=context):
+                if not put(record, context):
+                    break
+        except Exception as e:
+            print(f"Crawl {crawl} failed: {e}")
+        finally:
+            put(done, context)
+
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
         try:
-            price_model = get_app_store_price_model(app_info)
-            
-            url = app_info.get("trackViewUrl", "")
-            country_code = url.split("/")[3] if len(url.split("/")) > 3 else "US"  # Extract country code
-            
-            # Check for platform types in App Store
-            if 'Mac' in app_info.get("kind", ""):
-                app_type = "Desktop (macOS)"
-            
-            # Check if both iPhone and Mac are supported
-            if 'iPhone' in app_info.get("supportedDevices", []) and 'Mac' in app_info.get("supportedDevices", []):
-                app_type = "Mobile, Desktop (macOS)"
-            
-            description = app_info.get("description", "").replace('\n', '<br>')
-
-            apps_data.append({
-                "Name": app_info.get("trackName"),
-                "Description": description,
-                "Rating": app_info.get("averageUserRating"),
-                "Category": app_info.get("primaryGenreName"),
-                "Developer": app_info.get("artistName"),
-                "Release Date": app_info.get("releaseDate"),
-                "Age Limit": app_info.get("contentAdvisoryRating"),
-                "Country": country_code, 
-                "Platform": "App Store",
-                "Type": app_type,
-                "Price Model": price_model,
-                "URL": app_info.get("trackViewUrl", "#")
-            })
-        
-        except KeyError as e:
-            print(f"Error processing app: {e}")
-            continue  # Skip this app if we encounter a KeyError
-
-    return apps_data
-
-
-# Example: Search for "therapeutic AI" apps
-keyword = "therapeutic AI"
-
-# Scrape Google Play and App Store
-google_play_apps = scrape_google_play(keyword, max_results=500)
-app_store_apps = scrape_app_store(keyword, max_results=500)
-
-# Combine both datasets
-df_combined = pd.DataFrame(google_play_apps + app_store_apps)
-
-# Save to CSV 
-df_combined.to_csv("therapeutic_ai_apps_combined.csv", index=False)
-
-print("✅ Both Google Play and App Store data saved successfully!")
-
-# Analyzing the Data    -->  Load the combined CSV file
-df_combined = pd.read_csv("therapeutic_ai_apps_combined.csv")
-
-# Distribution of Ratings
-rating_distribution = df_combined['Rating'].value_counts()
-
-# Count of Apps by Category
-category_distribution = df_combined['Category'].value_counts()
-
-# Display the analysis
-print("\n✅ Rating distribution:")
-print(rating_distribution)
-
-print("\n✅ Category distribution:")
-print(category_distribution)
+            for crawl in crawls:
+                executor.submit(run, crawl)
+
+            remaining = len(crawls)
+            while remaining:
+                record = records.get()
+                if record is done:
+                    remaining -= 1
+                    continue
+
+                key = (record["Platform"], record["App ID"], record["Country"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield record
+        finally:
+            for context in contexts.values():
+                context.cancel()
+
+
+# Print the rating and category distribution of a scraped CSV
+def print_analytics(path):
+    import pandas as pd
+
+    # Analyzing the Data    -->  Load the combined CSV file
+    df_combined = pd.read_csv(path)
+
+    # Distribution of Ratings
+    rating_distribution = df_combined['Rating'].value_counts()
+
+    # Count of Apps by Category
+    category_distribution = df_combined['Category'].value_counts()
+
+    # Display the analysis
+    print("\n✅ Rating distribution:")
+    print(rating_distribution)
+
+    print("\n✅ Category distribution:")
+    print(category_distribution)
+
+
+# Same analysis as print_analytics, answered by the catalog's indexes for the apps seen since `since`
+def print_catalog_analytics(catalog, since):
+    print("\n✅ Rating distribution:")
+    for rating, count in catalog.count_by("rating", seen_since=since):
+        print(f"{rating}\t{count}")
+
+    print("\n✅ Category distribution:")
+    for category, count in catalog.count_by("category", seen_since=since):
+        print(f"{category}\t{count}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape Google Play and the App Store for a list of keywords.")
+    parser.add_argument("keywords", nargs="*", help='keywords to search for (default: "therapeutic AI")')
+    parser.add_argument("--keywords-file", help="file with one keyword per line")
+    parser.add_argument("--country", dest="countries", action="append", help="country code, can be repeated (default: US)")
+    parser.add_argument("--platform", choices=["google_play", "app_store", "both"], default="both")
+    parser.add_argument("--max-results", type=int, default=500, help="results per keyword, country and platform")
+    parser.add_argument("--workers", type=int, default=4, help="crawls running at the same time")
+    parser.add_argument("--detail-workers", type=int, default=DETAIL_WORKERS, help="threads fetching Google Play detail pages per crawl, how many call Play at once adapts below this")
+    parser.add_argument("--fast", action="store_true", help="build records from search results only, skipping Google Play detail pages")
+    parser.add_argument("--output", default="therapeutic_ai_apps_combined.csv", help='CSV snapshot to write ("" to skip)')
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="SQLite app catalog to upsert every app into")
+    parser.add_argument("--no-catalog", action="store_true", help="don't write to the app catalog")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch details for apps that are new or changed since they were last stored in the catalog")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                        help='SQLite file crawl progress is saved to, an interrupted run resumes from it ("" to disable)')
+    parser.add_argument("--no-resume", action="store_true", help="start every crawl over instead of resuming an interrupted run")
+    parser.add_argument("--no-analytics", action="store_true", help="don't print the rating and category distribution")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.incremental and args.no_catalog:
+        print("--incremental needs the app catalog, it can't be combined with --no-catalog.")
+        return
+
+    keywords = list(args.keywords)
+    if args.keywords_file:
+        with open(args.keywords_file, encoding="utf-8") as f:
+            keywords.extend(line.strip() for line in f if line.strip())
+    if not keywords:
+        keywords = ["therapeutic AI"]
+
+    countries = args.countries or ["US"]
+    platforms = ["google_play", "app_store"] if args.platform == "both" else [args.platform]
+    crawls = [(platform, keyword, country) for platform in platforms for keyword in keywords for country in countries]
+
+    catalog = None if args.no_catalog else Catalog(args.catalog)
+    started = time.time()
+
+    # Crawls an interrupted run left in the checkpoint resume where they stopped, unless we're told to start over
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    crawl_keys = [crawl_key(**get_crawl_params(crawl, args.max_results, args.fast)) for crawl in crawls]
+    if checkpoint and args.no_resume:
+        checkpoint.discard(crawl_keys)
+
+    # Scrape every crawl concurrently, streaming every record straight into the catalog and the CSV
+    records = iter_batch_records(crawls, workers=args.workers, max_results=args.max_results,
+                                 detail_workers=args.detail_workers, fast=args.fast,
+                                 catalog=catalog if args.incremental else None, checkpoint=checkpoint)
+    sinks = [CountingSink()]
+    if catalog:
+        sinks.append(CatalogSink(catalog))
+    if args.output:
+        sinks.append(CsvSink(args.output))
+    count = run_pipeline(records, *sinks)[0]
+
+    # Crawls that made it to the end have nothing left to resume, the ones cut short by an error stay for the next run
+    if checkpoint:
+        finished = [key for key in crawl_keys if checkpoint.finished(key)]
+        checkpoint.discard(finished)
+        if len(finished) < len(crawl_keys):
+            print(f"⚠️ {len(crawl_keys) - len(finished)} crawls didn't finish, run again to resume them from {args.checkpoint}")
+
+    saved_to = [path for path in [catalog and args.catalog, args.output] if path]
+    print(f"✅ {count} apps from {len(crawls)} crawls saved to {', '.join(saved_to) or 'nowhere'}")
+
+    if args.no_analytics or not count:
+        return
+    if catalog:
+        print_catalog_analytics(catalog, since=started)
+    elif args.output:
+        print_analytics(args.output)
+
+
+if __name__ == "__main__":
+    main()
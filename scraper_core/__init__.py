@@ -0,0 +1,55 @@
+from . import google_play, app_store
+from .records import RECORD_FIELDS, make_record, record_key, description_preview, resolve_fields, project_record
+from .pipeline import run_pipeline, ordered_map, ListSink, CountingSink, CallbackSink, CsvSink, DataFrameSink
+from .detail_cache import get_detail_cache
+from .result_cache import ResultCache, make_search_key, PARTIAL_RESULT_TTL
+from .jobs import JobManager
+from .export import iter_export, EXPORT_FORMATS
+from .catalog import Catalog, CatalogSink, get_catalog
+from .checkpoint import Checkpoint, crawl_key
+from .rate_limit import get_rate_limiter
+from .context import ScrapeContext, ScrapeCancelled
+from .circuit import get_breaker, breaker_stats, CircuitOpenError
+from .concurrency import AdaptiveLimiter, limiter_stats
+from .query import (
+    query_records, query_records_after, filter_records, sort_records, query_fingerprint, filter_options,
+    SORT_FIELDS, FILTER_FIELDS,
+)
+
+# Store adapters by the platform value used in forms and on the command line
+STORES = {
+    "google_play": google_play,
+    "app_store": app_store,
+}
+
+scrape_google_play = google_play.scrape
+scrape_app_store = app_store.scrape
+
+
+# Store adapter for a record's "Platform" value
+def get_store_for_record(record):
+    for store in STORES.values():
+        if store.PLATFORM == record.get("Platform"):
+            return store
+    return None
+
+
+# Whether a platform's store is failing right now and calls to it are being short-circuited
+def store_is_down(platform):
+    store = STORES.get(platform)
+    return store is not None and get_breaker(store.HOST).is_open()
+
+
+# Load fields a fast-mode record was built without (no-op for complete records)
+def fill_missing_details(record):
+    store = get_store_for_record(record)
+    return store.fill_missing_details(record) if store else record
+
+
+# Records for one (platform, keyword, country) search as a stream
+def iter_search_records(platform, keyword, max_results=500, country="US", device_type=None, progress=None, **options):
+    store = STORES.get(platform)
+    if store is None:
+        return iter(())
+    return store.iter_records(keyword, max_results=max_results, country=country, device_type=device_type,
+                              progress=progress, **options)
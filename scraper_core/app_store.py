@@ -0,0 +1,229 @@
+import os
+import requests
+from .http_client import http_get
+from .pipeline import ordered_map
+from .concurrency import AdaptiveLimiter
+from .context import ScrapeContext, DeadlineExceeded, ScrapeCancelled
+from .circuit import CircuitOpenError
+from .records import make_record, format_description, encode_signals, NOT_AVAILABLE, SIGNALS_KEY
+
+PLATFORM = "App Store"
+
+# Host every App Store request goes to, for the rate limiter and circuit breaker
+HOST = "itunes.apple.com"
+
+SEARCH_URL = f"https://{HOST}/search"
+LOOKUP_URL = f"https://{HOST}/lookup"
+
+# The Search API rejects limit > 200 and stops returning hits once offset + limit passes its result ceiling
+MAX_LIMIT = 200
+MAX_RESULTS = int(os.environ.get("ITUNES_MAX_RESULTS", 1000))
+
+# Hits per page request and threads per search requesting them. How many pages are requested at the same time is decided
+# by PAGE_LIMITER, which every search in the process shares and which adapts to how iTunes is coping
+PAGE_SIZE = int(os.environ.get("ITUNES_PAGE_SIZE", 50))
+PAGE_WORKERS = int(os.environ.get("ITUNES_PAGE_WORKERS", 8))
+PAGE_LIMITER = AdaptiveLimiter(
+    "app_store_pages",
+    initial=int(os.environ.get("ITUNES_PAGE_CONCURRENCY", 4)),
+    max_limit=int(os.environ.get("ITUNES_PAGE_MAX_CONCURRENCY", 16)),
+    target_latency=float(os.environ.get("ITUNES_PAGE_TARGET_LATENCY", 2.0)),
+)
+
+
+# Function to determine the price model for App Store
+def get_price_model(app_info):
+    price = app_info.get("price", 0.0)
+    if price == 0.0:
+        return "Free"
+    elif app_info.get("isInAppPurchaseEnabled", False):
+        return "Freemium"
+    else:
+        return "Premium"
+
+
+# Default "Mobile", check for macOS support
+def get_app_type(app_info):
+    supported_devices = app_info.get("supportedDevices", [])
+    if 'iPhone' in supported_devices and 'Mac' in supported_devices:
+        return "Mobile, Desktop (macOS)"
+    elif 'mac' in app_info.get("kind", "").lower():
+        return "Desktop (macOS)"
+    return "Mobile"
+
+
+# device_type "desktop" keeps apps that run on macOS, "mobile" drops macOS-only apps
+def matches_device_type(app_type, device_type):
+    if device_type == "desktop":
+        return "macOS" in app_type
+    elif device_type == "mobile":
+        return app_type != "Desktop (macOS)"
+    return True
+
+
+# Fetch one page of search hits
+def fetch_page(keyword, offset, limit, country="US", context=None):
+    params = {"term": keyword, "entity": "software", "limit": limit, "offset": offset, "country": country}
+    response = http_get(SEARCH_URL, params=params, context=context, limiter=PAGE_LIMITER)
+    return response.json().get("results", [])
+
+
+# Search stage: fetch one MAX_LIMIT page first, most searches have fewer hits than that. Only if it comes back full,
+# fire every remaining page request at once, then yield hits in rank order.
+# Stops at the first short page and drops apps that show up again on an overlapping page.
+# With a checkpoint, hits an earlier run found but never finished come first, then the search picks up at the stored offset.
+# progress(done, total) is called after every page
+def iter_search(keyword, max_results=500, country="US", page_size=PAGE_SIZE, max_workers=PAGE_WORKERS, progress=None,
+                checkpoint=None, context=None):
+    max_results = min(max_results, MAX_RESULTS)
+    page_size = max(1, min(page_size, MAX_LIMIT, max_results))
+
+    seen = set()
+    start = 0
+    if checkpoint is not None:
+        start, exhausted = checkpoint.state()
+        start = start or 0
+        seen = checkpoint.seen_keys()
+        yield from checkpoint.pending_hits()
+        if exhausted:
+            return
+
+    if start >= max_results:
+        return
+    found = len(seen)
+
+    # Yield the new hits of one page, returns whether it was the last page
+    def take_page(offset, limit, results):
+        nonlocal found
+        new_hits = []
+        for app_info in results:
+            track_id = str(app_info.get("trackId"))
+            if track_id in seen:
+                continue
+            seen.add(track_id)
+            new_hits.append(app_info)
+        found += len(new_hits)
+
+        next_offset = offset + limit
+        last_page = len(results) < limit or next_offset >= max_results
+        if checkpoint is not None:
+            checkpoint.add_page([(app_info.get("trackId"), app_info) for app_info in new_hits], next_offset,
+                                exhausted=last_page)
+
+        yield from new_hits
+
+        if progress:
+            progress(found, found)
+        return last_page  # A short page means there is nothing after it
+
+    def fetch(offset):
+        return fetch_page(keyword, offset, min(page_size, max_results - offset), country=country, context=context)
+
+    try:
+        first_limit = min(MAX_LIMIT, max_results - start)
+        results = fetch_page(keyword, start, first_limit, country=country, context=context)
+        if (yield from take_page(start, first_limit, results)):
+            return
+
+        offsets = list(range(start + first_limit, max_results, page_size))
+        deadline = context.deadline if context is not None else None
+        pages = ordered_map(fetch, offsets, max_workers=max_workers, window=len(offsets), deadline=deadline)
+        for offset, results in zip(offsets, pages):
+            if (yield from take_page(offset, min(page_size, max_results - offset), results)):
+                break
+    except DeadlineExceeded:
+        # Count what is pending in apps rather than pages: the part of max_results the search didn't get to (at most)
+        raise DeadlineExceeded(pending=max(0, max_results - found))
+
+
+# Normalize stage: turn a search hit into a record
+def normalize(app_info, country="US"):
+    url = app_info.get("trackViewUrl", "")
+    country_code = url.split("/")[3].upper() if len(url.split("/")) > 3 else country  # Extract country code
+
+    return make_record({
+        "Name": app_info.get("trackName"),
+        "Description": format_description(app_info.get("description")),
+        "Rating": app_info.get("averageUserRating"),
+        "Category": app_info.get("primaryGenreName"),
+        "Developer": app_info.get("artistName"),
+        "Release Date": app_info.get("releaseDate") or NOT_AVAILABLE,
+        "Age Limit": app_info.get("contentAdvisoryRating") or NOT_AVAILABLE,
+        "Country": country_code or country,
+        "Platform": PLATFORM,
+        "Type": get_app_type(app_info),
+        "Price Model": get_price_model(app_info),
+        "URL": url or "#",
+        "App ID": str(app_info.get("trackId", "")),
+    })
+
+
+# Cheap change signals carried by a search hit, if they match the catalog the app hasn't changed since we stored it
+def get_change_signals(app_info):
+    return encode_signals(app_info.get("version"), app_info.get("currentVersionReleaseDate"), app_info.get("userRatingCount"))
+
+
+# Pipeline: search pages -> records, yielded as soon as each one is ready.
+# Search hits already carry every field, so fast mode changes nothing here.
+# With a catalog, apps whose change signals match the stored ones are taken from the catalog (incremental mode).
+# With a checkpoint, records finished by an earlier run are replayed and every new one is saved as soon as it is built.
+# Every upstream call shares the retry budget, deadline and cancellation of `context`, a fresh ScrapeContext if none is given.
+def iter_records(keyword, max_results=500, country="US", device_type=None, max_workers=PAGE_WORKERS, progress=None, fast=False,
+                 catalog=None, checkpoint=None, context=None):
+    if not keyword:
+        print("Keyword cannot be empty.")
+        return
+    context = context or ScrapeContext()
+
+    if checkpoint is not None:
+        for record in checkpoint.completed_records():
+            if matches_device_type(record["Type"], device_type):
+                yield record
+
+    try:
+        for app_info in iter_search(keyword, max_results=max_results, country=country, max_workers=max_workers, progress=progress,
+                                    checkpoint=checkpoint, context=context):
+            signals = get_change_signals(app_info)
+            record = None
+            if catalog is not None:
+                stored, stored_signals = catalog.get_with_signals(PLATFORM, str(app_info.get("trackId", "")), country)
+                if stored is not None and stored_signals == signals:
+                    record = stored
+
+            record = record or normalize(app_info, country=country)
+            record[SIGNALS_KEY] = signals
+            if checkpoint is not None:
+                checkpoint.complete(app_info.get("trackId"), record)
+            if matches_device_type(record["Type"], device_type):
+                yield record
+
+    except (requests.exceptions.RequestException, CircuitOpenError) as e:
+        print(f"Error occurred while scraping the App Store: {e}")
+    except DeadlineExceeded as e:
+        context.expire(e.pending)  # Out of time, the records we have are all we get
+    except ScrapeCancelled:
+        pass  # Nobody wants the rest
+
+
+# A single app as a record, None if the App Store doesn't know it
+def fetch_record(app_id, country="US", context=None):
+    try:
+        response = http_get(LOOKUP_URL, params={"id": app_id, "country": country}, context=context)
+        results = response.json().get("results", [])
+    except (requests.exceptions.RequestException, ValueError, CircuitOpenError) as e:
+        print(f"Error looking up App Store app {app_id}: {e}")
+        return None
+    return normalize(results[0], country=country) if results else None
+
+
+# Every field comes with the search hit, there is never anything to fill in
+def fill_missing_details(record, context=None):
+    return record
+
+
+# App Store Scraping Function with error handling
+def scrape(keyword, max_results=500, country="US", device_type=None, max_workers=PAGE_WORKERS, progress=None, fast=False,
+           catalog=None, checkpoint=None, context=None):
+    return list(iter_records(keyword, max_results=max_results, country=country, device_type=device_type,
+                             max_workers=max_workers, progress=progress, catalog=catalog, checkpoint=checkpoint,
+                             context=context))
@@ -0,0 +1,205 @@
+import os
+import time
+import sqlite3
+import threading
+from .records import make_record, SIGNALS_KEY
+
+# Where the app catalog lives
+CATALOG_PATH = os.environ.get("CATALOG_PATH", "catalog.sqlite3")
+
+# Catalog column of every record field
+FIELD_COLUMNS = {
+    "Platform": "platform",
+    "App ID": "app_id",
+    "Country": "country",
+    "Name": "name",
+    "Description": "description",
+    "Rating": "rating",
+    "Category": "category",
+    "Developer": "developer",
+    "Release Date": "release_date",
+    "Age Limit": "age_limit",
+    "Type": "type",
+    "Price Model": "price_model",
+    "URL": "url",
+}
+COLUMN_FIELDS = {column: field for field, column in FIELD_COLUMNS.items()}
+
+# Columns query() may sort by
+SORT_COLUMNS = ["rating", "name", "release_date", "last_seen"]
+
+
+# Every app we have scraped, one row per (platform, app id, country), updated in place on every scrape
+class Catalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS apps (
+                platform TEXT NOT NULL,
+                app_id TEXT NOT NULL,
+                country TEXT NOT NULL,
+                name TEXT,
+                description TEXT,
+                rating REAL,
+                category TEXT,
+                developer TEXT,
+                release_date TEXT,
+                age_limit TEXT,
+                type TEXT,
+                price_model TEXT,
+                url TEXT,
+                signals TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (platform, app_id, country)
+            );
+            CREATE INDEX IF NOT EXISTS apps_developer ON apps (developer);
+            CREATE INDEX IF NOT EXISTS apps_category ON apps (category);
+            CREATE INDEX IF NOT EXISTS apps_price_model ON apps (price_model);
+            CREATE INDEX IF NOT EXISTS apps_rating ON apps (rating);
+        """)
+
+        # Catalogs created before change signals were tracked
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(apps)")]
+        if "signals" not in columns:
+            self._conn.execute("ALTER TABLE apps ADD COLUMN signals TEXT")
+        self._conn.commit()
+
+    # Insert new apps and refresh the ones we already know, first_seen is kept.
+    # A field the new record doesn't have keeps its stored value, and a record built without its detail page
+    # (no change signals, e.g. fast mode) only fills in fields the catalog doesn't have yet
+    def upsert(self, records):
+        columns = list(FIELD_COLUMNS.values()) + ["signals"]
+        updates = ", ".join(
+            f"{column}=CASE WHEN excluded.signals IS NULL THEN COALESCE({column}, excluded.{column}) "
+            f"ELSE COALESCE(excluded.{column}, {column}) END"
+            for column in columns[3:]
+        )
+        sql = (
+            f"INSERT INTO apps ({', '.join(columns)}, first_seen, last_seen) "
+            f"VALUES ({', '.join('?' for _ in columns)}, ?, ?) "
+            f"ON CONFLICT (platform, app_id, country) DO UPDATE SET {updates}, last_seen=excluded.last_seen"
+        )
+
+        now = time.time()
+        rows = []
+        for record in records:
+            if not record.get("App ID"):
+                continue  # Can't key an app without its ID
+            values = [record.get(field) for field in FIELD_COLUMNS] + [record.get(SIGNALS_KEY)]
+            values[2] = (values[2] or "").upper()
+            rows.append(values + [now, now])
+
+        with self._lock:
+            self._conn.executemany(sql, rows)
+            self._conn.commit()
+        return len(rows)
+
+    def _to_record(self, row):
+        return make_record({COLUMN_FIELDS[column]: row[column] for column in COLUMN_FIELDS})
+
+    def get(self, platform, app_id, country):
+        return self.get_with_signals(platform, app_id, country)[0]
+
+    # The stored record and change signals of an app, or (None, None) if we've never seen it
+    def get_with_signals(self, platform, app_id, country):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM apps WHERE platform=? AND app_id=? AND country=?", (platform, app_id, country.upper())
+            ).fetchone()
+        if row is None:
+            return None, None
+        return self._to_record(row), row["signals"]
+
+    # Apps matching every given filter, using the indexes on developer, category, price model and rating
+    def query(self, developer=None, category=None, price_model=None, platform=None, country=None, min_rating=None,
+              seen_since=None, order_by="rating", descending=True, limit=100, offset=0):
+        conditions, values = self._where(developer=developer, category=category, price_model=price_model,
+                                         platform=platform, country=country, min_rating=min_rating, seen_since=seen_since)
+        order_by = order_by if order_by in SORT_COLUMNS else "rating"
+        sql = (
+            f"SELECT * FROM apps {conditions} "
+            f"ORDER BY {order_by} IS NULL, {order_by} {'DESC' if descending else 'ASC'} LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, values + [limit, offset]).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    # Number of apps per value of a column, e.g. count_by("category")
+    def count_by(self, column, **filters):
+        if column not in COLUMN_FIELDS:
+            raise ValueError(f"Unknown column: {column}")
+        conditions, values = self._where(**filters)
+        sql = f"SELECT {column}, COUNT(*) FROM apps {conditions} GROUP BY {column} ORDER BY COUNT(*) DESC"
+        with self._lock:
+            return [(row[0], row[1]) for row in self._conn.execute(sql, values)]
+
+    def count(self, **filters):
+        conditions, values = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM apps {conditions}", values).fetchone()[0]
+
+    def _where(self, developer=None, category=None, price_model=None, platform=None, country=None, min_rating=None,
+               seen_since=None):
+        conditions = []
+        values = []
+        for column, value in [("developer", developer), ("category", category), ("price_model", price_model),
+                              ("platform", platform), ("country", country.upper() if country else None)]:
+            if value:
+                conditions.append(f"{column}=?")
+                values.append(value)
+        if min_rating is not None:
+            conditions.append("rating>=?")
+            values.append(min_rating)
+        if seen_since is not None:
+            conditions.append("last_seen>=?")
+            values.append(seen_since)
+        return ("WHERE " + " AND ".join(conditions)) if conditions else "", values
+
+
+# Pipeline sink that upserts records into the catalog in batches
+class CatalogSink:
+    def __init__(self, catalog, batch_size=100):
+        self.catalog = catalog
+        self.batch_size = batch_size
+        self.count = 0
+        self._batch = []
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        self.count += self.catalog.upsert(self._batch)
+        self._batch = []
+
+    def close(self):
+        self._flush()
+        return self.count
+
+
+_catalog = None
+_catalog_pid = None
+_catalog_lock = threading.Lock()
+
+
+# One catalog connection per process (SQLite handles must not cross a fork)
+def get_catalog():
+    global _catalog, _catalog_pid
+    pid = os.getpid()
+    if _catalog is None or _catalog_pid != pid:
+        with _catalog_lock:
+            if _catalog is None or _catalog_pid != pid:
+                _catalog = Catalog()
+                _catalog_pid = pid
+    return _catalog
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Where crawl state is kept between runs
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", os.path.join(".cache", "checkpoint.sqlite3"))
+
+
+# Key of one crawl, the same parameters always resume the same crawl
+def crawl_key(**params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Durable crawl state: the pagination cursor of every crawl, the hits it has found and the records already built from them.
+# Every page and every record is committed as soon as we have it, so a crawl killed halfway resumes where it stopped.
+class Checkpoint:
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS crawls (
+                crawl TEXT PRIMARY KEY,
+                params TEXT NOT NULL,
+                cursor TEXT,
+                exhausted INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS hits (
+                crawl TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                hit TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                record TEXT,
+                PRIMARY KEY (crawl, item_key)
+            );
+        """)
+        self._conn.commit()
+
+    # State of one crawl, created empty the first time it is asked for
+    def crawl(self, **params):
+        key = crawl_key(**params)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO crawls (crawl, params, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(params, sort_keys=True, default=str), time.time()),
+            )
+            self._conn.commit()
+        return CrawlCheckpoint(self, key)
+
+    # Whether a crawl got past its last search page and built a record from every hit it found
+    def finished(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT exhausted FROM crawls WHERE crawl=?", (key,)).fetchone()
+            pending = self._conn.execute("SELECT COUNT(*) FROM hits WHERE crawl=? AND done=0", (key,)).fetchone()[0]
+        return bool(row and row[0]) and not pending
+
+    # Forget crawls, e.g. once a run that covered them has finished
+    def discard(self, keys):
+        keys = list(keys)
+        with self._lock:
+            self._conn.executemany("DELETE FROM hits WHERE crawl=?", [(key,) for key in keys])
+            self._conn.executemany("DELETE FROM crawls WHERE crawl=?", [(key,) for key in keys])
+            self._conn.commit()
+
+
+# The checkpointed state of a single crawl, what the store adapters read and write while they scrape
+class CrawlCheckpoint:
+    def __init__(self, checkpoint, key):
+        self.checkpoint = checkpoint
+        self.key = key
+
+    def _query(self, sql, values=()):
+        with self.checkpoint._lock:
+            return self.checkpoint._conn.execute(sql, (self.key,) + tuple(values)).fetchall()
+
+    # (cursor, exhausted): where the next search page starts (None before the first page) and whether there is one
+    def state(self):
+        cursor, exhausted = self._query("SELECT cursor, exhausted FROM crawls WHERE crawl=?")[0]
+        return (json.loads(cursor) if cursor else None), bool(exhausted)
+
+    # Keys of every hit found so far, done or not
+    def seen_keys(self):
+        return {row[0] for row in self._query("SELECT item_key FROM hits WHERE crawl=?")}
+
+    # Hits found by an earlier run that never became a record, in rank order
+    def pending_hits(self):
+        rows = self._query("SELECT hit FROM hits WHERE crawl=? AND done=0 ORDER BY position")
+        return [json.loads(row[0]) for row in rows]
+
+    # Records finished by an earlier run, in rank order (hits whose details couldn't be fetched have none)
+    def completed_records(self):
+        rows = self._query("SELECT record FROM hits WHERE crawl=? AND done=1 AND record IS NOT NULL ORDER BY position")
+        return [json.loads(row[0]) for row in rows]
+
+    # Store a search page: its new hits as (key, hit) pairs and the cursor of the page after it, in one transaction
+    def add_page(self, hits, cursor, exhausted=False):
+        conn = self.checkpoint._conn
+        with self.checkpoint._lock:
+            position = conn.execute("SELECT COUNT(*) FROM hits WHERE crawl=?", (self.key,)).fetchone()[0]
+            conn.executemany(
+                "INSERT OR IGNORE INTO hits (crawl, item_key, position, hit) VALUES (?, ?, ?, ?)",
+                [(self.key, str(key), position + i, json.dumps(hit, default=str)) for i, (key, hit) in enumerate(hits)],
+            )
+            conn.execute(
+                "UPDATE crawls SET cursor=?, exhausted=?, updated_at=? WHERE crawl=?",
+                (json.dumps(cursor) if cursor is not None else None, int(exhausted), time.time(), self.key),
+            )
+            conn.commit()
+
+    # Mark a hit done with the record built from it (None if it was skipped)
+    def complete(self, key, record):
+        conn = self.checkpoint._conn
+        with self.checkpoint._lock:
+            conn.execute(
+                "UPDATE hits SET done=1, record=? WHERE crawl=? AND item_key=?",
+                (json.dumps(record, default=str) if record is not None else None, self.key, str(key)),
+            )
+            conn.commit()
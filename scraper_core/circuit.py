@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+
+# Consecutive transient failures that open a host's circuit, and how long it stays open before one probe call is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+# Raised instead of calling a host whose circuit is open
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} is failing, not calling it for another {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+# Circuit breaker for one upstream host.
+# closed: calls go through, open: calls fail straight away, half_open: a single probe call decides whether to close again
+class CircuitBreaker:
+    def __init__(self, host, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    # Raise CircuitOpenError unless a call may go through right now, returns whether the call is the half-open probe
+    def before_call(self):
+        with self._lock:
+            now = time.time()
+            if self.state == OPEN:
+                waited = now - self.opened_at
+                if waited < self.reset_timeout:
+                    raise CircuitOpenError(self.host, self.reset_timeout - waited)
+                self.state = HALF_OPEN
+                self._probe_started = None
+
+            if self.state == HALF_OPEN:
+                # One probe at a time, a probe that never reported back doesn't block the host forever
+                if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                    raise CircuitOpenError(self.host, self.reset_timeout - (now - self._probe_started))
+                self._probe_started = now
+                return True
+        return False
+
+    # The probe never got an answer (the scrape stopped waiting for it), let the next call probe instead
+    def release_probe(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_started = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_started = None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    # Whether calls are being short-circuited right now
+    def is_open(self):
+        with self._lock:
+            return self.state == OPEN and time.time() - self.opened_at < self.reset_timeout
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened_at": self.opened_at or None}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+# The process-wide breaker of a host
+def get_breaker(host):
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.host: breaker.stats() for breaker in breakers}
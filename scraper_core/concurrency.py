@@ -0,0 +1,154 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from .context import DeadlineExceeded, ScrapeCancelled
+
+# How often a waiting acquire() looks at the cancel event
+CANCEL_POLL_INTERVAL = 0.25
+
+# Longest a call we stopped waiting on may keep its slot. Past that it is counted as overloaded and its slot given back
+# even if it is still running, so calls hung on a dead connection can't use up the limit for good
+SLOT_MAX_HOLD = float(os.environ.get("SLOT_MAX_HOLD", 60))
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# A slot held with AdaptiveLimiter.slot
+class Slot:
+    def __init__(self):
+        self.future = None
+
+    # The call goes on after we stopped waiting for it, keep the slot until its future is done
+    def hand_off(self, future):
+        self.future = future
+
+
+# AIMD concurrency limit for one kind of upstream call, shared by every scrape in the process.
+# Each call that comes back faster than target_latency grows the limit by 1/limit (so about +1 per round of calls),
+# an overloaded call (429, 503, timeout) halves it, at most once per cooldown so one burst of failures counts once
+class AdaptiveLimiter:
+    def __init__(self, name, initial=4, min_limit=1, max_limit=32, target_latency=2.0, decrease=0.5, cooldown=None,
+                 max_hold=SLOT_MAX_HOLD):
+        self.name = name
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.cooldown = target_latency if cooldown is None else cooldown
+        self.max_hold = max_hold
+        self.in_flight = 0
+        self.calls = 0
+        self.overloads = 0
+        self._decreased_at = 0.0
+        self._waiting = deque()
+        self._changed = threading.Condition()
+
+        with _limiters_lock:
+            _limiters[name] = self
+
+    # Block until there is room under the current limit, raise DeadlineExceeded if there is none within `timeout` seconds
+    # and ScrapeCancelled once the `cancelled` event is set.
+    # Slots go out first come first served, so calls made in rank order finish in rank order
+    def acquire(self, timeout=None, cancelled=None):
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._changed:
+            ticket = object()
+            self._waiting.append(ticket)
+            try:
+                while not (self._waiting[0] is ticket and self.in_flight < int(self.limit)):
+                    if cancelled is not None and cancelled.is_set():
+                        raise ScrapeCancelled()
+                    wait = CANCEL_POLL_INTERVAL if cancelled is not None else None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise DeadlineExceeded()
+                        wait = min(wait, remaining) if wait is not None else remaining
+                    self._changed.wait(wait)
+                self.in_flight += 1
+            finally:
+                self._waiting.remove(ticket)
+                self._changed.notify_all()
+
+    # Give the slot back and adjust the limit from how the call went
+    def release(self, latency=None, overloaded=False):
+        with self._changed:
+            self.in_flight -= 1
+            self.calls += 1
+            now = time.time()
+            if overloaded:
+                self.overloads += 1
+                if now - self._decreased_at >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._decreased_at = now
+            elif latency is not None and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._changed.notify_all()
+
+    # Hold a slot around one upstream call, is_overloaded(error) tells which failures should shrink the limit.
+    # If we stop waiting on a call that goes on running in the background, hand its future to the yielded Slot:
+    # the slot is then given back once the call is really over (or after max_hold seconds), so in_flight keeps counting it
+    @contextmanager
+    def slot(self, is_overloaded=None, timeout=None, cancelled=None):
+        self.acquire(timeout=timeout, cancelled=cancelled)
+        started = time.time()
+        held = Slot()
+        try:
+            yield held
+        except Exception as e:
+            if held.future is not None:
+                self._hold(held.future, started, is_overloaded)
+            else:
+                self.release(overloaded=bool(is_overloaded and is_overloaded(e)))
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.release(latency=time.time() - started)
+
+    # Give back the slot of a call we stopped waiting on once it has finished, or once it has run max_hold seconds,
+    # whichever comes first. The slot is given back only once either way
+    def _hold(self, future, started, is_overloaded=None):
+        once = threading.Lock()
+
+        def release_call(future):
+            if not once.acquire(blocking=False):
+                return
+            timer.cancel()
+            error = future.exception() if not future.cancelled() else None
+            if error is not None:
+                self.release(overloaded=bool(is_overloaded and is_overloaded(error)))
+            else:
+                self.release(latency=time.time() - started)
+
+        def give_up():
+            if once.acquire(blocking=False):
+                print(f"{self.name}: a call is still running after {self.max_hold:g}s, giving its slot back")
+                self.release(overloaded=True)
+
+        timer = threading.Timer(self.max_hold, give_up)
+        timer.daemon = True
+        timer.start()
+        future.add_done_callback(release_call)
+
+    def stats(self):
+        with self._changed:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "max_limit": self.max_limit,
+                "target_latency": self.target_latency,
+                "calls": self.calls,
+                "overloads": self.overloads,
+            }
+
+
+def limiter_stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
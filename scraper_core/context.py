@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+
+# Retries one scrape may spend across all of its upstream calls before failures are given up on
+RETRY_BUDGET = int(os.environ.get("RETRY_BUDGET", 20))
+
+
+# Raised once a scrape's deadline has passed, pending is how much outstanding work was given up on
+class DeadlineExceeded(Exception):
+    def __init__(self, pending=0):
+        super().__init__(f"Deadline exceeded with {pending} pending")
+        self.pending = pending
+
+
+# Raised by every upstream call of a scrape once it has been cancelled
+class ScrapeCancelled(Exception):
+    def __init__(self):
+        super().__init__("Scrape cancelled")
+
+
+# State shared by every upstream call a single scrape makes.
+# With a timeout (seconds), every call made after deadline raises DeadlineExceeded and waits never run past it.
+# cancel() stops the scrape the same way: calls not started yet raise ScrapeCancelled and waits return early
+class ScrapeContext:
+    def __init__(self, retry_budget=RETRY_BUDGET, timeout=None):
+        self.retry_budget = retry_budget
+        self.retries = 0
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self.partial = False  # Set once an upstream failure or the deadline cost us results
+        self.pending = 0  # Apps still outstanding when the deadline hit (at most)
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    # Take one retry out of the scrape's budget, False once it is spent
+    def spend_retry(self):
+        with self._lock:
+            if self.retries >= self.retry_budget:
+                return False
+            self.retries += 1
+            return True
+
+    # Seconds left before the deadline, None without one
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    # Raise ScrapeCancelled or DeadlineExceeded if the scrape has to stop
+    def check(self):
+        if self.cancelled.is_set():
+            raise ScrapeCancelled()
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.partial = True
+            raise DeadlineExceeded()
+
+    # Stop the scrape, whatever it has so far is partial
+    def cancel(self):
+        self.partial = True
+        self.cancelled.set()
+
+    # Sleep, but wake up with ScrapeCancelled as soon as the scrape is cancelled
+    def sleep(self, seconds):
+        if self.cancelled.wait(seconds):
+            raise ScrapeCancelled()
+
+    # Record that the scrape stopped at its deadline with `pending` work left
+    def expire(self, pending=0):
+        with self._lock:
+            self.partial = True
+            self.pending = max(self.pending, pending)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Where the cache lives, how long an entry stays fresh and how big the file may grow
+CACHE_PATH = os.environ.get("DETAIL_CACHE_PATH", os.path.join(".cache", "details.sqlite3"))
+CACHE_TTL = int(os.environ.get("DETAIL_CACHE_TTL", 24 * 60 * 60))
+CACHE_MAX_BYTES = int(os.environ.get("DETAIL_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# How often a process writes the access times of its cache hits, drops expired entries and re-counts the bytes stored
+# (other processes write to the same file). Between syncs hits only touch memory and puts keep a running byte total
+CACHE_SYNC_INTERVAL = float(os.environ.get("DETAIL_CACHE_SYNC_INTERVAL", 30))
+
+
+# On-disk cache of Google Play detail pages keyed by (app_id, lang, country)
+class DetailCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, sync_interval=CACHE_SYNC_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}  # Access times of hits not written yet
+        self._bytes = 0
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS details (
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (app_id, lang, country)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS details_accessed_at ON details (accessed_at)")
+        self._sync(time.time())
+        self._conn.commit()
+
+    def get(self, app_id, lang="en", country="us"):
+        key = (app_id, lang.lower(), country.lower())
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM details WHERE app_id=? AND lang=? AND country=?", key
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+
+            self._touched[key] = now
+            self.hits += 1
+            if now - self._synced_at > self.sync_interval:
+                self._sync(now)
+                self._conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, app_id, details, lang="en", country="us"):
+        payload = json.dumps(details, default=str)
+        now = time.time()
+        key = (app_id, lang.lower(), country.lower())
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM details WHERE app_id=? AND lang=? AND country=?", key
+            ).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               key + (payload, len(payload), now, now))
+            self._touched.pop(key, None)
+            self._bytes += len(payload) - (old[0] if old else 0)
+
+            if self._bytes > self.max_bytes or now - self._synced_at > self.sync_interval:
+                self._evict(now)
+            self._conn.commit()
+
+    # Write the pending access times, drop expired entries and re-count the bytes stored
+    def _sync(self, now):
+        self._conn.executemany(
+            "UPDATE details SET accessed_at=? WHERE app_id=? AND lang=? AND country=?",
+            [(accessed_at,) + key for key, accessed_at in self._touched.items()],
+        )
+        self._touched.clear()
+        self._conn.execute("DELETE FROM details WHERE fetched_at < ?", (now - self.ttl,))
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM details").fetchone()[0]
+        self._synced_at = now
+
+    # Sync, then drop the least recently used entries until we are under the byte cap
+    def _evict(self, now):
+        self._sync(now)
+        if self._bytes <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT app_id, lang, country, size FROM details ORDER BY accessed_at")
+        evicted = []
+        for app_id, lang, country, size in rows:
+            if self._bytes <= self.max_bytes:
+                break
+            evicted.append((app_id, lang, country))
+            self._bytes -= size
+
+        self._conn.executemany("DELETE FROM details WHERE app_id=? AND lang=? AND country=?", evicted)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM details").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+# One cache connection per process (SQLite handles must not cross a fork)
+def get_detail_cache():
+    global _cache, _cache_pid
+    pid = os.getpid()
+    if _cache is None or _cache_pid != pid:
+        with _cache_lock:
+            if _cache is None or _cache_pid != pid:
+                _cache = DetailCache()
+                _cache_pid = pid
+    return _cache
+
+
+# Return cached details for an app, calling fetch(app_id, lang, country) on a miss
+def cached_details(app_id, fetch, lang="en", country="us"):
+    cache = get_detail_cache()
+    details = cache.get(app_id, lang=lang, country=country)
+    if details is None:
+        details = fetch(app_id, lang=lang, country=country)
+        cache.put(app_id, details, lang=lang, country=country)
+    return details
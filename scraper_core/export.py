@@ -0,0 +1,37 @@
+import io
+import csv
+import json
+from .records import RECORD_FIELDS, project_record
+
+# Content type and file extension of every export format
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# CSV text one line at a time, so an export never holds more than one row in memory
+def iter_csv(records, fields=RECORD_FIELDS):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for record in records:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(record)
+        yield buffer.getvalue()
+
+
+# One JSON object per line
+def iter_ndjson(records, fields=RECORD_FIELDS):
+    for record in records:
+        yield json.dumps(project_record(record, fields), default=str) + "\n"
+
+
+def iter_export(records, export_format, fields=RECORD_FIELDS):
+    if export_format == "csv":
+        return iter_csv(records, fields)
+    return iter_ndjson(records, fields)
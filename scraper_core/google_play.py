@@ -0,0 +1,347 @@
+import os
+import threading
+from functools import partial
+from google_play_scraper import app as google_play_app
+from urllib.error import URLError
+from urllib.request import urlopen
+import google_play_scraper.utils.request as play_request
+from google_play_scraper.exceptions import GooglePlayScraperException
+from .detail_cache import cached_details, get_detail_cache
+from .play_search import iter_search_pages
+from .pipeline import ordered_map
+from .concurrency import AdaptiveLimiter
+from .retry import call_with_retry, is_retryable
+from .context import ScrapeContext, DeadlineExceeded, ScrapeCancelled
+from .circuit import CircuitOpenError
+from .http_client import READ_TIMEOUT
+from .records import make_record, format_description, encode_signals, NOT_AVAILABLE, SIGNALS_KEY
+
+PLATFORM = "Google Play"
+
+# Host every Google Play request goes to, for the rate limiter and circuit breaker
+HOST = "play.google.com"
+
+# Threads per scrape fetching Google Play detail pages. How many of them may call Play at the same time is decided by
+# DETAIL_LIMITER, which every scrape in the process shares and which adapts to how Play is coping
+DETAIL_WORKERS = int(os.environ.get("DETAIL_WORKERS", 32))
+DETAIL_LIMITER = AdaptiveLimiter(
+    "google_play_details",
+    initial=int(os.environ.get("DETAIL_CONCURRENCY", 8)),
+    max_limit=int(os.environ.get("DETAIL_MAX_CONCURRENCY", 32)),
+    target_latency=float(os.environ.get("DETAIL_TARGET_LATENCY", 2.0)),
+)
+
+# google_play_scraper opens every Play page (details and search alike) with urlopen and no timeout, so a stalled socket
+# would hang the call, the thread running it and its concurrency slot for good. Give it the read timeout of our own requests
+def _urlopen_with_timeout(url, data=None, timeout=READ_TIMEOUT, **kwargs):
+    return urlopen(url, data, timeout, **kwargs)
+
+
+play_request.urlopen = _urlopen_with_timeout
+
+# Record fields that only the detail page has, fast mode loads them on demand
+LAZY_FIELDS = ["Description", "Release Date", "Age Limit"]
+
+
+# Function to determine the price model for Google Play
+def get_price_model(details):
+    price = details.get("price", "")
+
+    # Check if the price is an integer or float and convert it to string
+    if isinstance(price, (int, float)):
+        price = str(price)
+
+    # Check for free apps or zero-price
+    if isinstance(price, str) and "free" in price.lower():
+        return "Free"
+    elif price == "0" or price == "0.0":
+        return "Free"  # Explicitly handle the case where the price is 0
+    else:
+        return "Paid"
+
+
+# Google Play apps always run on phones, some also on Chromebooks or Android TV
+def get_app_type(details):
+    genre = details.get("genre") or ""
+    if "Chromebook" in genre:
+        return "Mobile, Desktop (Chromebook)"
+    elif "Android TV" in genre:
+        return "Mobile, Android TV"
+    return "Mobile"
+
+
+# device_type "desktop" only keeps apps that also run on Chromebook or Android TV, anything else keeps every app
+def matches_device_type(app_type, device_type):
+    if device_type == "desktop":
+        return app_type != "Mobile"
+    return True
+
+
+# Fetch a detail page from the store once the rate and concurrency limiters let us, retrying transient failures
+def fetch_app(app_id, lang="en", country="us", context=None):
+    def attempt():
+        return google_play_app(app_id, lang=lang, country=country)
+
+    return call_with_retry(attempt, context=context, host=HOST, limiter=DETAIL_LIMITER)
+
+
+# Errors that make us skip a single app instead of failing the whole scrape: Play doesn't know it (NotFoundError),
+# or fetching it kept failing after its retries (ExtraHTTPError, URLError, a read timeout)
+DETAIL_ERRORS = (GooglePlayScraperException, URLError, TimeoutError)
+
+
+# Report an app we are skipping, one that failed for a transient reason leaves the scrape partial
+def skip_app(app_id, error, context=None):
+    print(f"Error fetching details for app {app_id}: {error}")
+    if context is not None and is_retryable(error):
+        context.partial = True
+
+
+# Fetch the details of a single app through the detail cache, raising whatever fetching it raised
+def load_details(app_id, country="US", context=None):
+    return cached_details(app_id, partial(fetch_app, context=context), lang="en", country=country.lower())
+
+
+# Fetch the details of a single app (through the detail cache), returns None if the app should be skipped
+def fetch_details(app_id, country="US", context=None):
+    try:
+        return load_details(app_id, country=country, context=context)
+    except DETAIL_ERRORS as e:
+        skip_app(app_id, e, context)
+        return None
+
+
+# Search stage: yield search hits in rank order, following continuation tokens until we have max_results.
+# Stops early once a page adds no app we haven't seen yet.
+# With a checkpoint, hits an earlier run found but never finished come first, then the search picks up at the stored token.
+def iter_search(keyword, max_results=500, country="US", checkpoint=None, context=None):
+    seen = set()
+    token = None
+    if checkpoint is not None:
+        token, exhausted = checkpoint.state()
+        seen = checkpoint.seen_keys()
+        yield from checkpoint.pending_hits()
+        if exhausted or len(seen) >= max_results:
+            return
+
+    found = len(seen)
+    for hits, next_token in iter_search_pages(keyword, lang="en", country=country.lower(), token=token, context=context):
+        new_hits = []
+        for hit in hits:
+            if hit["appId"] in seen or found + len(new_hits) >= max_results:
+                continue
+            seen.add(hit["appId"])
+            new_hits.append(hit)
+
+        found += len(new_hits)
+        last_page = not new_hits or not next_token or found >= max_results
+        if checkpoint is not None:
+            checkpoint.add_page([(hit["appId"], hit) for hit in new_hits], next_token, exhausted=last_page)
+
+        yield from new_hits
+        if last_page:
+            break
+
+
+# Normalize stage: turn app details into a record
+def normalize(app_id, details, country="US"):
+    return make_record({
+        "Name": details.get("title"),
+        "Description": format_description(details.get("description")),
+        "Rating": details.get("score"),
+        "Category": details.get("genre"),
+        "Developer": details.get("developer"),
+        "Release Date": details.get("released") or NOT_AVAILABLE,
+        "Age Limit": details.get("contentRating") or NOT_AVAILABLE,
+        "Country": country,
+        "Platform": PLATFORM,
+        "Type": get_app_type(details),
+        "Price Model": get_price_model(details),
+        "URL": f"https://play.google.com/store/apps/details?id={app_id}",
+        "App ID": app_id,
+    })
+
+
+# A single app as a record, None if Google Play doesn't know it or its details can't be fetched right now
+def fetch_record(app_id, country="US", context=None):
+    try:
+        details = fetch_details(app_id, country=country, context=context)
+    except CircuitOpenError as e:
+        print(f"Error looking up Google Play app {app_id}: {e}")
+        return None
+    return normalize(app_id, details, country=country) if details is not None else None
+
+
+# Fast mode: build a record from the search hit alone.
+# Details already in the cache are used for free, anything else they would add stays None until fill_missing_details.
+def normalize_search_hit(hit, country="US"):
+    app_id = hit["appId"]
+    cached = get_detail_cache().get(app_id, lang="en", country=country.lower())
+    if cached is not None:
+        return normalize(app_id, cached, country=country)
+
+    return make_record({
+        "Name": hit.get("title"),
+        "Description": format_description(hit.get("description")) or None,
+        "Rating": hit.get("score"),
+        "Category": hit.get("genre"),
+        "Developer": hit.get("developer"),
+        "Country": country,
+        "Platform": PLATFORM,
+        "Type": get_app_type(hit),
+        "Price Model": get_price_model(hit),
+        "URL": f"https://play.google.com/store/apps/details?id={app_id}",
+        "App ID": app_id,
+    })
+
+
+# Fetch the detail page of a fast-mode record and fill in the fields its search hit didn't have
+def fill_missing_details(record, context=None):
+    missing = [field for field in LAZY_FIELDS if record.get(field) is None]
+    if not missing:
+        return record
+
+    try:
+        details = fetch_details(record["App ID"], country=record["Country"], context=context)
+    except CircuitOpenError as e:
+        print(f"Not loading details for app {record['App ID']}: {e}")
+        return record
+    if details is not None:
+        full_record = normalize(record["App ID"], details, country=record["Country"])
+        for field in missing:
+            record[field] = full_record[field]
+    return record
+
+
+# Cheap change signals carried by a search hit, if they match the catalog the app hasn't changed since we stored it.
+# Play search hits have no version or update time, so score, installs and price stand in for them.
+def get_change_signals(hit):
+    return encode_signals(hit.get("score"), hit.get("installs"), hit.get("price"))
+
+
+# Build a record for every search hit in parallel, yielding them in search-rank order.
+# progress(done, total) is called every time a record is ready, past the deadline DeadlineExceeded is raised
+def iter_hit_records(hits, build, max_workers=DETAIL_WORKERS, progress=None, deadline=None):
+    counts = {"done": 0, "total": 0}
+    counts_lock = threading.Lock()
+
+    def counted(hits):
+        for hit in hits:
+            with counts_lock:
+                counts["total"] += 1
+            yield hit
+
+    def build_counted(hit):
+        record = build(hit)
+        if progress:
+            with counts_lock:
+                counts["done"] += 1
+                progress(counts["done"], counts["total"])
+        return record
+
+    yield from ordered_map(build_counted, counted(hits), max_workers=max_workers, deadline=deadline)
+
+
+# Apps a scrape stopped at its deadline still owed: the hits being fetched (in_flight), the ones the search had already
+# found, and while the search wasn't through, the rest of max_results it could still have found (an upper bound then).
+# found is {"hits": hits handed to the detail stage, "searched": whether the search got through every page}
+def count_pending(hits, found, in_flight, max_results):
+    built = found["hits"] - in_flight
+    try:
+        for _ in hits:  # Hits already found come straight out, fetching another search page fails at the deadline
+            pass
+    except Exception:
+        pass
+    if found["searched"]:
+        return found["hits"] - built
+    return max(0, max_results - built)
+
+
+# Pipeline: search hits -> app IDs -> details -> records, yielded as soon as each one is ready.
+# With fast=True records are built from the search hits, and only hits too thin for a list row (no title) cost a detail request.
+# With a catalog, apps whose change signals match the stored ones are taken from the catalog instead (incremental mode).
+# With a checkpoint, records finished by an earlier run are replayed and every new one is saved as soon as it is built.
+# Every upstream call shares the retry budget, deadline and cancellation of `context`, a fresh ScrapeContext if none is given.
+def iter_records(keyword, max_results=500, country="US", device_type=None, max_workers=DETAIL_WORKERS, progress=None,
+                 fast=False, catalog=None, checkpoint=None, context=None):
+    if not keyword:
+        print("Keyword cannot be empty.")
+        return
+    context = context or ScrapeContext()
+
+    replayed = 0
+    if checkpoint is not None:
+        for record in checkpoint.completed_records():
+            replayed += 1
+            if matches_device_type(record["Type"], device_type):
+                yield record
+
+    found = {"hits": 0, "searched": False}
+
+    def counted(hits):
+        for hit in hits:
+            found["hits"] += 1
+            yield hit
+        found["searched"] = True
+
+    def build(hit):
+        app_id = hit["appId"]
+        signals = get_change_signals(hit)
+
+        record = None
+        done = True  # False if the record is missing or a stub because of a failure worth trying again
+        if catalog is not None:
+            stored, stored_signals = catalog.get_with_signals(PLATFORM, app_id, country)
+            if stored is not None and stored_signals == signals:
+                record = stored
+
+        if record is None and fast and hit.get("title"):
+            record = normalize_search_hit(hit, country=country)
+        elif record is None:
+            try:
+                record = normalize(app_id, load_details(app_id, country=country, context=context), country=country)
+            except CircuitOpenError:
+                # Play is down: keep what the search hit told us, the rest loads on demand once it is back
+                record = normalize_search_hit(hit, country=country) if hit.get("title") else None
+                done = False
+            except DETAIL_ERRORS as e:
+                skip_app(app_id, e, context)
+                done = not is_retryable(e)
+
+        # Only a record with everything the detail page has may be reused by a later incremental run
+        if record is not None and all(record.get(field) is not None for field in LAZY_FIELDS):
+            record[SIGNALS_KEY] = signals
+        # A resumed crawl tries again the apps we only have a stub of, or none at all, because of a transient failure
+        if checkpoint is not None and done:
+            checkpoint.complete(app_id, record)
+        return record
+
+    hits = counted(iter_search(keyword, max_results=max_results, country=country, checkpoint=checkpoint, context=context))
+    try:
+        for record in iter_hit_records(hits, build, max_workers=max_workers, progress=progress, deadline=context.deadline):
+            if record is None:
+                continue  # Skip if there's an error fetching details for this app
+
+            if matches_device_type(record["Type"], device_type):
+                yield record
+
+    except DeadlineExceeded as e:
+        # Out of time, the records we have are all we get
+        context.expire(count_pending(hits, found, e.pending, max_results - replayed))
+    except ScrapeCancelled:
+        pass  # Nobody wants the rest
+    except (GooglePlayScraperException, URLError, TimeoutError, CircuitOpenError) as e:
+        print(f"Error occurred while scraping Google Play: {e}")
+        context.partial = True
+    except Exception as e:
+        # Most likely a page google_play_scraper couldn't parse, keep the records we have
+        print(f"Unexpected error while scraping Google Play: {e!r}")
+        context.partial = True
+
+
+# Google Play Scraping Function with error handling
+def scrape(keyword, max_results=500, country="US", device_type=None, max_workers=DETAIL_WORKERS, progress=None, fast=False,
+           catalog=None, checkpoint=None, context=None):
+    return list(iter_records(keyword, max_results=max_results, country=country, device_type=device_type,
+                             max_workers=max_workers, progress=progress, fast=fast, catalog=catalog, checkpoint=checkpoint,
+                             context=context))
@@ -0,0 +1,67 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .retry import call_with_retry, RETRY_STATUSES
+
+# Connect / read timeouts (seconds) for every upstream call
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 20))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Number of hosts kept in the pool and keep-alive connections kept per host
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 16))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+# Build a session with keep-alive connection pooling and gzip enabled
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+# Shared process-wide session, rebuilt after a fork so gunicorn workers never share sockets
+def get_session():
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+# A request timeout cut down to what is left of the scrape's deadline
+def _bounded_timeout(timeout, context):
+    remaining = context.remaining() if context is not None else None
+    if remaining is None:
+        return timeout
+    remaining = max(remaining, 0.001)
+    if isinstance(timeout, tuple):
+        return tuple(min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+# GET through the shared session, always with a timeout and after the host's rate limiter lets us.
+# Connection errors, timeouts, 429 and 5xx are retried with backoff out of the context's retry budget,
+# and short-circuited while the host's circuit breaker is open. A limiter (AdaptiveLimiter) caps concurrent calls
+def http_get(url, params=None, timeout=DEFAULT_TIMEOUT, context=None, limiter=None):
+    def attempt():
+        response = get_session().get(url, params=params, timeout=_bounded_timeout(timeout, context))
+        if response.status_code in RETRY_STATUSES:
+            raise requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+        return response
+
+    return call_with_retry(attempt, context=context, host=url, limiter=limiter)
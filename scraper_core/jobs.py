@@ -0,0 +1,171 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .records import make_record
+from .context import ScrapeContext
+
+# How many scrapes run at the same time, and how long finished jobs are kept around
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS", 2))
+JOB_TTL = int(os.environ.get("JOB_TTL", 60 * 60))
+
+# A job that was being streamed is abandoned, and its scrape cancelled, once its last stream has been closed for
+# JOB_DISCONNECT_GRACE seconds (long enough for an EventSource to reconnect) and nobody polled it in the meantime.
+# Jobs that were never streamed (submitted through the API and polled) only stop when they are cancelled explicitly
+JOB_DISCONNECT_GRACE = int(os.environ.get("JOB_DISCONNECT_GRACE", 10))
+
+
+# A background scrape and its progress
+class Job:
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.done = 0
+        self.total = 0
+        self.results = None
+        self.records = []  # Records streamed so far, in search-rank order
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.context = ScrapeContext()  # Shared by every upstream call of the job's scrape, cancel() stops them
+        self.listeners = 0  # Clients streaming the job right now
+        self.streamed = False  # Whether a client ever streamed it
+        self.last_seen = self.created_at
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("finished", "failed", "cancelled")
+
+    # A client polled the job
+    def touch(self):
+        self.last_seen = time.time()
+
+    # A client started or stopped streaming the job
+    def open_stream(self):
+        with self._changed:
+            self.listeners += 1
+            self.streamed = True
+            self.touch()
+
+    def close_stream(self):
+        with self._changed:
+            self.listeners -= 1
+            self.touch()
+
+    # Stop the scrape: calls not made yet are dropped, rate-limit tokens and concurrency slots go to other scrapes
+    def cancel(self):
+        if not self.finished and not self.context.cancelled.is_set():
+            print(f"Cancelling job {self.id}")
+            self.context.cancel()
+
+    def abandoned(self):
+        return self.streamed and self.listeners == 0 and time.time() - self.last_seen > JOB_DISCONNECT_GRACE
+
+    # Cancel the scrape if nobody is waiting for it any more
+    def _check_abandoned(self):
+        if not self.finished and self.abandoned():
+            self.cancel()
+
+    def update_progress(self, done, total):
+        self.done = done
+        self.total = total
+        self._check_abandoned()
+
+    # Called by the scraper as soon as a record is ready
+    def add_record(self, record):
+        with self._changed:
+            self.records.append(record)
+            self._changed.notify_all()
+        self._check_abandoned()
+
+    # Block until there are records after index start (or the job ends), returns (new records, finished)
+    def wait_for_records(self, start, timeout=None):
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.records) > start or self.finished, timeout)
+            return self.records[start:], self.finished
+
+    # Every record of the job, waiting for new ones until it ends. The job counts as streamed while this runs
+    def iter_records(self):
+        self.open_stream()
+        try:
+            sent = 0
+            while True:
+                records, finished = self.wait_for_records(sent)
+                yield from records
+                sent += len(records)
+                if finished:
+                    return
+        finally:
+            self.close_stream()
+
+    def _finish(self, status, results=None, error=None):
+        with self._changed:
+            if results is not None:
+                # Cached or coalesced searches never stream, so the final list replaces what we have
+                self.results = results
+                self.records = list(results)
+            self.error = error
+            self.status = status
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def to_dict(self, include_results=True):
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "progress": {"done": self.done, "total": self.total},
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if include_results and self.results is not None:
+            data["results"] = [make_record(record) for record in self.results]
+        return data
+
+
+# Runs scrapes on its own worker pool so web threads never wait on a crawl
+class JobManager:
+    def __init__(self, max_workers=CRAWL_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="crawl")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # Queue work(job) and return the job straight away, work returns the list of records
+    def submit(self, params, work):
+        job = Job(params)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, work):
+        job._check_abandoned()  # Its page went away while it was queued
+        if job.context.cancelled.is_set():
+            job._finish("cancelled", results=[])
+            return
+
+        job.status = "running"
+        try:
+            results = work(job)
+            job._finish("cancelled" if job.context.cancelled.is_set() else "finished", results=results)
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job._finish("failed", error=str(e))
+
+    # Forget finished jobs older than the TTL
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
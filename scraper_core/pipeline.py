@@ -0,0 +1,119 @@
+import csv
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from .context import DeadlineExceeded
+from .records import RECORD_FIELDS
+
+
+# Like executor.map, but only keeps `window` calls in flight so memory stays bounded for long inputs.
+# Results are yielded in input order as soon as each one is ready.
+# With a deadline (a time.time() timestamp), raises DeadlineExceeded with the number of calls left once it passes
+def ordered_map(fn, items, max_workers=8, window=None, deadline=None):
+    max_workers = max(1, max_workers)
+    window = window or max_workers * 2
+    pending = deque()
+
+    def next_result():
+        timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+        try:
+            return pending[0].result(timeout=timeout)
+        except (FutureTimeout, DeadlineExceeded):
+            raise DeadlineExceeded(pending=len(pending))
+        finally:
+            if pending and pending[0].done():
+                pending.popleft()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield next_result()
+        while pending:
+            yield next_result()
+    except DeadlineExceeded as e:
+        raise DeadlineExceeded(pending=max(e.pending, len(pending)))
+    finally:
+        # The consumer stopped early, don't start work nobody will read and don't wait on calls still running
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+# Collects records in memory
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        return self.records
+
+
+# Only counts the records going through
+class CountingSink:
+    def __init__(self):
+        self.count = 0
+
+    def write(self, record):
+        self.count += 1
+
+    def close(self):
+        return self.count
+
+
+# Hands every record to a callback, e.g. a background job streaming to a browser
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, record):
+        self.callback(record)
+
+    def close(self):
+        return None
+
+
+# Appends records to a CSV file one row at a time
+class CsvSink:
+    def __init__(self, path, fields=RECORD_FIELDS):
+        self.path = path
+        self.fields = fields
+        self.count = 0
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, record):
+        self._writer.writerow(record)
+        self.count += 1
+        if self.count % 50 == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+        return self.path
+
+
+# Builds a pandas DataFrame once the stream is finished
+class DataFrameSink(ListSink):
+    def close(self):
+        import pandas as pd
+        return pd.DataFrame(self.records, columns=RECORD_FIELDS)
+
+
+# Push every record through every sink, returns what each sink's close() returned.
+# If a sink fails, a record generator is closed straight away so the scrape behind it stops too
+def run_pipeline(records, *sinks):
+    try:
+        for record in records:
+            for sink in sinks:
+                sink.write(record)
+    finally:
+        if hasattr(records, "close"):
+            records.close()
+        results = [sink.close() for sink in sinks]
+    return results
@@ -0,0 +1,104 @@
+import json
+from urllib.parse import quote
+from google_play_scraper.constants.element import ElementSpecs
+from google_play_scraper.constants.regex import Regex
+from google_play_scraper.constants.request import Formats
+from google_play_scraper.exceptions import NotFoundError
+from google_play_scraper.utils.request import get, post
+from .retry import call_with_retry
+
+# google_play_scraper.search only reads the first result page, so we follow the store's continuation tokens ourselves.
+# Later pages come from the same batchexecute RPC the Play website calls when you scroll a search.
+BATCHEXECUTE_URL = "https://play.google.com/_/PlayStoreUi/data/batchexecute?rpcids=qnKhOb&hl={lang}&gl={country}"
+PAGE_SIZE = 50
+PAGE_PAYLOAD = (
+    '[[["qnKhOb","[[null,[[10,[10,{page_size}]],true,null,'
+    '[96,27,4,8,57,30,110,79,11,16,49,1,3,9,12,104,55,56,51,10,34,77]],null,\\"{token}\\"]]",null,"generic"]]]'
+)
+
+
+# GET a Play page once the rate limiter lets us, retrying transient failures
+def _get(url, context=None):
+    return call_with_retry(lambda: get(url), context=context, host=url)
+
+
+# data[path[0]][path[1]]..., or None if the store changed its layout
+def _nested(data, path):
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def _extract_hits(items):
+    hits = []
+    for item in items or []:
+        hit = {k: spec.extract_content(item) for k, spec in ElementSpecs.SearchResult.items()}
+        if hit.get("appId"):
+            hits.append(hit)
+    return hits
+
+
+# First page: the search HTML, holds the top result, the first hits and the token for the next page
+def _fetch_first_page(keyword, lang, country, context=None):
+    query = quote(keyword)
+    try:
+        dom = _get(Formats.Searchresults.build(query=query, lang=lang, country=country), context=context)
+    except NotFoundError:
+        dom = _get(Formats.Searchresults.fallback_build(query=query, lang=lang), context=context)
+
+    dataset = {}
+    for match in Regex.SCRIPT.findall(dom):
+        key_match = Regex.KEY.findall(match)
+        value_match = Regex.VALUE.findall(match)
+        if key_match and value_match:
+            dataset[key_match[0]] = json.loads(value_match[0])
+
+    hits = []
+    top_result = _nested(dataset, ["ds:4", 0, 1, 0, 23, 16])
+    if top_result:
+        hits.append({k: spec.extract_content(top_result) for k, spec in ElementSpecs.SearchResultOnTop.items()})
+
+    # The result cluster sits at a different index depending on country and language
+    for section in _nested(dataset, ["ds:4", 0, 1]) or []:
+        items = _nested(section, [22, 0])
+        if items:
+            return hits + _extract_hits(items), _nested(section, [22, 1, 3, 1])
+    return hits, None
+
+
+# Following pages: a batchexecute call with the continuation token
+def _fetch_next_page(token, lang, country, page_size=PAGE_SIZE, context=None):
+    body = "f.req=" + quote(PAGE_PAYLOAD.format(page_size=page_size, token=token))
+    url = BATCHEXECUTE_URL.format(lang=lang, country=country)
+
+    def attempt():
+        return post(url, body.encode(), {"content-type": "application/x-www-form-urlencoded"})
+
+    response = call_with_retry(attempt, context=context, host=url)
+
+    # The response is ")]}'" followed by a JSON envelope whose payload is itself JSON
+    try:
+        envelope = json.loads(response[response.index("["):])
+        payload = _nested(envelope, [0, 2])
+        data = json.loads(payload) if payload else None
+    except ValueError as e:
+        print(f"Could not read Google Play search page: {e}")
+        return [], None
+
+    if not data:
+        return [], None
+    return _extract_hits(_nested(data, [0, 0, 0])), _nested(data, [0, 0, 7, 1])
+
+
+# Yield (hits, next_token) for each result page, starting after `token` if one is given
+def iter_search_pages(keyword, lang="en", country="us", token=None, context=None):
+    if token is None:
+        hits, token = _fetch_first_page(keyword, lang, country, context=context)
+        yield hits, token
+
+    while token:
+        hits, token = _fetch_next_page(token, lang, country, context=context)
+        yield hits, token
@@ -0,0 +1,142 @@
+import math
+import json
+import base64
+import hashlib
+from datetime import datetime
+
+# Columns results can be sorted by, by the value used in URLs
+SORT_FIELDS = {
+    "rating": "Rating",
+    "release_date": "Release Date",
+    "name": "Name",
+}
+
+# Columns results can be filtered on, by the value used in URLs
+FILTER_FIELDS = {
+    "price_model": "Price Model",
+    "category": "Category",
+    "app_platform": "Platform",
+    "type": "Type",
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Google Play gives "Mar 5, 2021", the App Store gives "2021-03-05T08:00:00Z"
+DATE_FORMATS = ["%b %d, %Y", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d"]
+
+
+def parse_date(value):
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value), date_format)
+        except ValueError:
+            continue
+    return None
+
+
+# Sort key that puts missing values last whichever way we sort
+def _sort_value(record, field):
+    value = record.get(field)
+    if field == "Release Date":
+        value = parse_date(value)
+    elif field == "Name":
+        value = (value or "").lower() or None
+    elif isinstance(value, float) and math.isnan(value):
+        value = None
+    return value
+
+
+def sort_records(records, sort=None, descending=False):
+    field = SORT_FIELDS.get(sort)
+    if field is None:
+        return list(records)
+
+    present = [record for record in records if _sort_value(record, field) is not None]
+    missing = [record for record in records if _sort_value(record, field) is None]
+    return sorted(present, key=lambda record: _sort_value(record, field), reverse=descending) + missing
+
+
+# filters maps FILTER_FIELDS keys to the value a record must have, empty values are ignored
+def filter_records(records, filters=None):
+    wanted = {FILTER_FIELDS[key]: value for key, value in (filters or {}).items() if key in FILTER_FIELDS and value}
+    if not wanted:
+        return list(records)
+    return [record for record in records if all(str(record.get(field)) == value for field, value in wanted.items())]
+
+
+# Distinct values of every filterable column, for building the filter dropdowns
+def filter_options(records):
+    options = {}
+    for key, field in FILTER_FIELDS.items():
+        options[key] = sorted({str(record[field]) for record in records if record.get(field) not in (None, "")})
+    return options
+
+
+def clamp_page_size(size):
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+# Filter, sort and cut one page out of a result set
+def query_records(records, filters=None, sort=None, descending=False, page=1, size=DEFAULT_PAGE_SIZE):
+    matching = sort_records(filter_records(records, filters), sort=sort, descending=descending)
+    size = clamp_page_size(size)
+    pages = max(1, math.ceil(len(matching) / size))
+    try:
+        page = min(max(1, int(page)), pages)
+    except (TypeError, ValueError):
+        page = 1
+
+    start = (page - 1) * size
+    return {
+        "rows": matching[start:start + size],
+        "total": len(matching),
+        "page": page,
+        "pages": pages,
+        "size": size,
+    }
+
+
+# Short hash of whatever defines a result listing, so a cursor can't be replayed against a different query
+def query_fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+# Opaque cursor pointing at an offset in one particular listing
+def encode_cursor(offset, fingerprint):
+    data = json.dumps({"o": offset, "f": fingerprint}).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+# Offset a cursor points at, raises ValueError if it is malformed or belongs to another query
+def decode_cursor(cursor, fingerprint):
+    if not cursor:
+        return 0
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(data["o"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if data.get("f") != fingerprint or offset < 0:
+        raise ValueError("Cursor does not belong to this query")
+    return offset
+
+
+# Filter and sort a result set, then return `limit` records starting at `cursor` and the cursor of the next batch
+def query_records_after(records, cursor=None, fingerprint="", filters=None, sort=None, descending=False, limit=DEFAULT_PAGE_SIZE):
+    matching = sort_records(filter_records(records, filters), sort=sort, descending=descending)
+    offset = decode_cursor(cursor, fingerprint)
+    limit = clamp_page_size(limit)
+
+    end = offset + limit
+    return {
+        "rows": matching[offset:end],
+        "total": len(matching),
+        "next_cursor": encode_cursor(end, fingerprint) if end < len(matching) else None,
+    }
@@ -0,0 +1,159 @@
+import os
+import time
+import sqlite3
+import threading
+from urllib.parse import urlparse
+from .context import DeadlineExceeded, ScrapeCancelled
+
+# Where the token buckets live, every process on the machine (gunicorn workers, CLI runs) shares them through this file
+RATE_LIMIT_PATH = os.environ.get("RATE_LIMIT_PATH", os.path.join(".cache", "rate_limit.sqlite3"))
+
+# (requests per second, burst) of every upstream host, RATE_LIMITS="host=rate:burst,..." overrides them.
+# A rate of 0 turns throttling off for that host. Apple documents about 20 Search API calls per minute
+DEFAULT_RATE_LIMITS = {
+    "play.google.com": (10.0, 20),
+    "itunes.apple.com": (20 / 60, 3),
+}
+DEFAULT_RATE_LIMIT = (5.0, 10)
+
+
+# Parse "play.google.com=10:20,itunes.apple.com=1" into {host: (rate, burst)}, the burst defaults to the rate
+def parse_rate_limits(spec):
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        host, value = item.split("=", 1)
+        rate, _, burst = value.partition(":")
+        rate = float(rate)
+        limits[host.strip().lower()] = (rate, float(burst) if burst else max(1.0, rate))
+    return limits
+
+
+RATE_LIMITS = dict(DEFAULT_RATE_LIMITS, **parse_rate_limits(os.environ.get("RATE_LIMITS")))
+
+
+# Token bucket per upstream host, kept in SQLite so every process draws from the same budget.
+# BEGIN IMMEDIATE takes the database write lock, so refilling and taking a token is atomic across processes
+class RateLimiter:
+    def __init__(self, path=RATE_LIMIT_PATH, limits=None):
+        self.path = path
+        self.limits = RATE_LIMITS if limits is None else limits
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                host TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def get_limit(self, host):
+        return self.limits.get(host, DEFAULT_RATE_LIMIT)
+
+    # Block until the host's bucket has a token for us.
+    # With a timeout, raise DeadlineExceeded straight away if the token won't come in time (without taking it).
+    # Setting the `cancelled` event stops the wait with ScrapeCancelled
+    def acquire(self, host, timeout=None, cancelled=None):
+        rate, burst = self.get_limit(host)
+        if rate <= 0:
+            return
+
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            wait = self._take(host, rate, burst)
+            if wait <= 0:
+                return
+            if deadline is not None and time.time() + wait > deadline:
+                raise DeadlineExceeded()
+            if cancelled is not None:
+                if cancelled.wait(wait):
+                    raise ScrapeCancelled()
+            else:
+                time.sleep(wait)
+
+    # Give back a token that was taken for a call that never happened
+    def refund(self, host):
+        rate, burst = self.get_limit(host)
+        if rate <= 0:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE buckets SET tokens=MIN(?, tokens + 1) WHERE host=?", (burst, host))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # Refill the bucket for the time that passed and take a token, returns how long to wait if there was none
+    def _take(self, host, rate, burst):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute("SELECT tokens, updated_at FROM buckets WHERE host=?", (host,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+
+                self._conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (host, tokens, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    # Tokens left in every bucket, for monitoring
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT host, tokens, updated_at FROM buckets").fetchall()
+        now = time.time()
+        stats = {}
+        for host, tokens, updated_at in rows:
+            rate, burst = self.get_limit(host)
+            stats[host] = {"rate": rate, "burst": burst, "tokens": min(burst, tokens + max(0.0, now - updated_at) * rate)}
+        return stats
+
+
+_limiter = None
+_limiter_pid = None
+_limiter_lock = threading.Lock()
+
+
+# One limiter connection per process (SQLite handles must not cross a fork)
+def get_rate_limiter():
+    global _limiter, _limiter_pid
+    pid = os.getpid()
+    if _limiter is None or _limiter_pid != pid:
+        with _limiter_lock:
+            if _limiter is None or _limiter_pid != pid:
+                _limiter = RateLimiter()
+                _limiter_pid = pid
+    return _limiter
+
+
+# Host a URL (or a bare host name) points at
+def get_host(url):
+    return (urlparse(url).netloc if "//" in url else url).lower()
+
+
+# Wait for a token of the host a URL points at, at most `timeout` seconds or until `cancelled` is set
+def throttle(url, timeout=None, cancelled=None):
+    get_rate_limiter().acquire(get_host(url), timeout=timeout, cancelled=cancelled)
+
+
+# Give back the token of a call that was never made
+def refund(url):
+    get_rate_limiter().refund(get_host(url))
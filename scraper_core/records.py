@@ -0,0 +1,62 @@
+import json
+
+# Columns of a scraped app record, in the order they are written out
+RECORD_FIELDS = [
+    "Name", "Description", "Rating", "Category", "Developer", "Release Date",
+    "Age Limit", "Country", "Platform", "Type", "Price Model", "URL", "App ID",
+]
+
+# Value used when a store doesn't tell us a release date or age limit
+NOT_AVAILABLE = "Not Available"
+
+# Internal record key holding the cheap change signals of the search hit the record was built from.
+# It is not part of the schema, so make_record() and every export leave it out.
+SIGNALS_KEY = "_signals"
+
+
+# Build a record with every field of the schema, in schema order (missing fields become None)
+def make_record(values):
+    return {field: values.get(field) for field in RECORD_FIELDS}
+
+
+# Serialize change signals so they can be stored and compared
+def encode_signals(*values):
+    return json.dumps(values, default=str)
+
+
+# Turn store line breaks into HTML so descriptions stay readable in the results table
+def format_description(description):
+    return (description or "").replace("\n", "<br>")
+
+
+# Identifies one app in one country's store
+def record_key(record):
+    return (record.get("Platform"), record.get("App ID"), (record.get("Country") or "").upper())
+
+
+# Start of a description for list views, and whether anything was cut off
+def description_preview(description, limit=150):
+    if not description:
+        return "", False
+    if len(description) <= limit:
+        return description, False
+    return description[:limit] + "...", True
+
+
+# Schema field names from a comma separated list like "name,rating,release_date", raises ValueError on unknown names
+def resolve_fields(names):
+    by_name = {field.lower().replace(" ", "_"): field for field in RECORD_FIELDS}
+    fields = []
+    for name in names.split(","):
+        name = name.strip().lower().replace(" ", "_")
+        if not name:
+            continue
+        if name not in by_name:
+            raise ValueError(f"Unknown field: {name}")
+        fields.append(by_name[name])
+    return fields or list(RECORD_FIELDS)
+
+
+# Only the given fields of a record
+def project_record(record, fields):
+    return {field: record.get(field) for field in fields}
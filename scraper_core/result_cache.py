@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# How long a finished search stays fresh and how many searches we keep per process
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 15 * 60))
+
+# How long a search cut short (deadline, store outage) stays fresh, long enough to page through it without re-scraping
+PARTIAL_RESULT_TTL = int(os.environ.get("PARTIAL_RESULT_TTL", 2 * 60))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 256))
+
+
+# Normalize the search form so "Therapy " and "therapy" share one cache entry
+def make_search_key(keyword, platform, device_type=None, country="US", fast=False):
+    keyword = " ".join((keyword or "").lower().split())
+    return (keyword, platform or "", device_type or "", (country or "US").upper(), bool(fast))
+
+
+# A scrape currently running for a key, other requests for the same key wait on it
+class _Flight:
+    def __init__(self, snapshot=None):
+        self.done = threading.Event()
+        self.value = None
+        self.info = None
+        self.error = None
+        self.snapshot = snapshot  # What the computation has so far, for callers that stop waiting on it
+
+
+# In-memory TTL cache of search results with single-flight request coalescing.
+# Every entry carries an info object next to its value (e.g. whether the result is complete) and may have a TTL of its own.
+# Expired entries are kept (until the size cap pushes them out) so get_stale() can still serve them while a store is down,
+# and one stored with a TTL of its own (a partial result) keeps the entry it replaced for get_stale().
+# If index_key is given, every item of a cached list can also be found on its own with find().
+class ResultCache:
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES, index_key=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_key = index_key
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._index = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._get_locked(key)
+            return entry[0] if entry is not None else None
+
+    # (value, info) of a fresh entry, None if there is none
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, ttl, value, info, _ = entry
+        if time.time() - stored_at > (self.ttl if ttl is None else ttl):
+            return None
+        self._entries.move_to_end(key)
+        return value, info
+
+    # (value, info) last stored for key however old it is, (None, None) if we never had one.
+    # A short-lived entry gives way to the regular one it replaced
+    def get_stale(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            return entry[4] or (entry[2], entry[3])
+
+    # Store value for ttl seconds (the cache's ttl by default)
+    def put(self, key, value, info=None, ttl=None):
+        with self._lock:
+            fallback = None
+            if key in self._entries:
+                old = self._entries[key]
+                if ttl is not None:
+                    fallback = old[4] if old[1] is not None else (old[2], old[3])
+                self._drop_locked(key)
+            self._entries[key] = (time.time(), ttl, value, info, fallback)
+            if self.index_key:
+                for item in value:
+                    self._index[self.index_key(item)] = (key, item)
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+
+    def _drop_locked(self, key):
+        value = self._entries.pop(key)[2]
+        if self.index_key:
+            for item in value:
+                item_key = self.index_key(item)
+                if self._index.get(item_key, (None,))[0] == key:
+                    del self._index[item_key]
+
+    # A single item of a cached list, by its index_key
+    def find(self, item_key):
+        with self._lock:
+            entry = self._index.get(item_key)
+            if entry is None or self._get_locked(entry[0]) is None:
+                return None
+            return entry[1]
+
+    # Return (value, info) for key: the cached entry, or what compute() returns, run once no matter how many callers ask
+    # at the same time.
+    # ttl(info) is how long a computed value stays cached: None for the cache's ttl, 0 not to store it at all.
+    # accept(info) tells whether a cached value, or one computed for another caller, will do. If not, we compute our own.
+    # A caller waiting on another one's computation stops after `timeout` seconds and gets (snapshot(), None):
+    # whatever the computation has so far, snapshot being the function its caller passed in
+    def get_or_compute(self, key, compute, ttl=None, accept=None, timeout=None, snapshot=None):
+        with self._lock:
+            entry = self._get_locked(key)
+            if entry is not None and (accept is None or accept(entry[1])):
+                self.hits += 1
+                return entry
+
+            flight = self._inflight.get(key)
+            if flight is None:
+                self.misses += 1
+                flight = _Flight(snapshot)
+                self._inflight[key] = flight
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                return (flight.snapshot() if flight.snapshot else None), None
+            if flight.error is not None:
+                raise flight.error
+            if accept is None or accept(flight.info):
+                return flight.value, flight.info
+            return self.get_or_compute(key, compute, ttl=ttl, accept=accept, timeout=timeout, snapshot=snapshot)
+
+        try:
+            value, info = compute()
+            seconds = ttl(info) if ttl is not None else None
+            if seconds != 0:
+                self.put(key, value, info, ttl=seconds)
+            flight.value, flight.info = value, info
+            return value, info
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "in_flight": len(self._inflight),
+            }
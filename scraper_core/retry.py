@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from email.utils import parsedate_to_datetime
+from urllib.error import URLError, HTTPError
+import requests
+from google_play_scraper.exceptions import ExtraHTTPError
+from .circuit import get_breaker, CircuitOpenError
+from .rate_limit import get_host, throttle, refund
+from .context import DeadlineExceeded, ScrapeCancelled
+from .concurrency import CANCEL_POLL_INTERVAL
+
+# Tries per upstream call (the first one included) and the backoff between them: base * 2^attempt seconds,
+# jittered and capped at RETRY_MAX_DELAY. A Retry-After longer than the cap isn't waited for, the call fails instead
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", 4))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 30))
+
+# Threads running upstream calls for scrapes that have a deadline
+DEADLINE_WORKERS = int(os.environ.get("DEADLINE_WORKERS", 64))
+
+# Status codes worth trying again, and the ones that mean we are pushing the store too hard
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+OVERLOAD_STATUSES = {429, 503}
+
+
+# The HTTP status behind a failed call, None if it never got a response
+def get_status(error):
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code
+    # google_play_scraper raises ExtraHTTPError while handling urllib's HTTPError, which keeps the status and headers
+    cause = error.__context__ if isinstance(error, ExtraHTTPError) else error
+    return cause.code if isinstance(cause, HTTPError) else None
+
+
+# Seconds the server asked us to wait (Retry-After, in seconds or as an HTTP date), None if it didn't say
+def get_retry_after(error):
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else None
+    cause = error.__context__ if isinstance(error, ExtraHTTPError) else error
+    if headers is None and isinstance(cause, HTTPError):
+        headers = cause.headers
+
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Connection failures, timeouts, 429 and 5xx are transient, anything else (404, bad request, parse errors) is not
+def is_retryable(error):
+    status = get_status(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return isinstance(error, (ExtraHTTPError, URLError, ConnectionError, TimeoutError))
+
+
+# Rate limiting, overload and timeouts: the store wants less concurrency from us
+def is_overloaded(error):
+    status = get_status(error)
+    if status is not None:
+        return status in OVERLOAD_STATUSES
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError)):
+        return True
+    return isinstance(error, URLError) and isinstance(error.reason, TimeoutError)
+
+
+# Full-jitter exponential backoff, never shorter than what the server asked for
+def backoff_delay(attempt, retry_after=None):
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+# Threads that run upstream calls of scrapes with a deadline, so waiting on a call can stop at the deadline even when
+# the client under it (google_play_scraper's urlopen) has no timeout of its own
+def get_deadline_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=DEADLINE_WORKERS, thread_name_prefix="upstream")
+                _executor_pid = pid
+    return _executor
+
+
+# fn(), but given up on with DeadlineExceeded once the context's deadline passes, or ScrapeCancelled once it is cancelled.
+# A call given up on that is already running can't be stopped, on_abandon(future) is told about it
+def call_before_deadline(fn, context=None, on_abandon=None):
+    remaining = context.remaining() if context is not None else None
+    if remaining is None:
+        return fn()
+    context.check()
+
+    future = get_deadline_executor().submit(fn)
+    while True:
+        try:
+            return future.result(timeout=min(max(0.0, context.remaining()), CANCEL_POLL_INTERVAL))
+        except FutureTimeout:
+            try:
+                context.check()
+            except (DeadlineExceeded, ScrapeCancelled):
+                if not future.cancel() and on_abandon is not None:
+                    on_abandon(future)
+                raise
+
+
+# Call fn(), trying again with backoff while it fails with a transient error.
+# Every retry is taken from the scrape's budget (context.spend_retry), once that is spent failures are raised straight away.
+# With a host, every attempt waits for the host's rate limiter and goes through its circuit breaker: transient failures
+# count towards opening it, and while it is open CircuitOpenError is raised without calling fn at all (the scrape is marked
+# partial either way). With a limiter (AdaptiveLimiter), every attempt also holds one of its slots.
+# No attempt, wait or backoff runs past the context's deadline, DeadlineExceeded is raised instead.
+# Once the context is cancelled every wait stops with ScrapeCancelled, and a rate-limit token taken for an attempt
+# that never got to call fn is given back
+def call_with_retry(fn, context=None, attempts=RETRY_ATTEMPTS, host=None, limiter=None):
+    breaker = get_breaker(get_host(host)) if host else None
+    attempt = 0
+    while True:
+        if context is not None:
+            context.check()
+
+        try:
+            probe = breaker is not None and breaker.before_call()
+        except CircuitOpenError:
+            if context is not None:
+                context.partial = True
+            raise
+
+        timeout = context.remaining() if context is not None else None
+        cancelled = context.cancelled if context is not None else None
+        token = False  # Holding a rate-limit token we haven't spent yet
+        try:
+            if host:
+                throttle(host, timeout=timeout, cancelled=cancelled)
+                token = True
+            if limiter is not None:
+                with limiter.slot(is_overloaded, timeout=timeout, cancelled=cancelled) as slot:
+                    token = False
+                    result = call_before_deadline(fn, context, on_abandon=slot.hand_off)
+            else:
+                token = False
+                result = call_before_deadline(fn, context)
+        except (DeadlineExceeded, ScrapeCancelled) as e:
+            if token:
+                refund(host)
+            if probe:
+                breaker.release_probe()
+            if isinstance(e, DeadlineExceeded) and context is not None:
+                context.expire()
+            raise
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None:
+                # Anything but a transient failure (a 404, say) still means the host is answering
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+
+            attempt += 1
+            delay = backoff_delay(attempt - 1, get_retry_after(e))
+            remaining = context.remaining() if context is not None else None
+            gave_up = (
+                attempt >= attempts or not retryable
+                or delay > RETRY_MAX_DELAY  # The server wants us gone for longer than we are willing to wait
+                or (remaining is not None and delay >= remaining)
+                or (context is not None and not context.spend_retry())
+            )
+            if gave_up:
+                if retryable and context is not None:
+                    context.partial = True
+                raise
+
+            if context is not None:
+                context.sleep(delay)
+            else:
+                time.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result